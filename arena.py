@@ -0,0 +1,226 @@
+from array import array
+from dataclasses import fields
+from typing import Any, Iterator
+
+from tau import asts
+from tau.tokens import Coord, Span, Token
+
+from names import NameTable
+from scanner import KINDS, KIND_ID
+
+
+# node classes by type number, and for each class its fields in order,
+# split into what the arena stores per node: at most one Token, child nodes
+# (or None) and lists of child nodes. BoolLiteral.value is the only other
+# field, and it follows from the token's kind
+NODE_TYPES: list[type] = sorted(
+    (
+        cls
+        for cls in vars(asts).values()
+        if isinstance(cls, type) and issubclass(cls, asts.AST)
+    ),
+    key=lambda cls: cls.__name__,
+)
+TYPE_ID: dict[type, int] = {cls: i for i, cls in enumerate(NODE_TYPES)}
+
+_TOKEN, _NODE, _LIST, _VALUE = range(4)
+
+
+def _layout(cls: type) -> list[tuple[str, int]]:
+    layout = []
+    for f in fields(cls):
+        if not f.init or f.name == "span":
+            continue
+        if f.name in ("token", "op", "size"):
+            layout.append((f.name, _TOKEN))
+        elif f.name == "value":
+            layout.append((f.name, _VALUE))
+        elif f.name in ("params", "decls", "stmts", "args"):
+            layout.append((f.name, _LIST))
+        else:
+            layout.append((f.name, _NODE))
+    return layout
+
+
+_LAYOUT: list[list[tuple[str, int]]] = [_layout(cls) for cls in NODE_TYPES]
+
+
+class Arena:
+    # a tree stored as parallel arrays indexed by node number, in preorder
+    # (node 0 is the root). Node i is of type NODE_TYPES[type[i]], spans
+    # line:column to end_line:end_column and its edges start at first[i]:
+    # one entry per child field (a node number, or -1 for None) and, for a
+    # list field, its length followed by the items. A node's token, if any,
+    # is token_kind/token_value (a KIND_ID and a names id) plus token_span.
+    # Pass results go in attributes, one list per attribute name, instead of
+    # an attribute on every node object.
+    #
+    # This is a layout for measuring, used by bench.py arena only: the
+    # passes and the driver work on tau.asts objects, and nothing fills in
+    # attributes, so the pipeline's nodes still carry their own __dict__
+    def __init__(self, names: NameTable | None = None):
+        self.names = names if names is not None else NameTable()
+        self.type = array("B")
+        self.parent = array("i")
+        self.line = array("I")
+        self.column = array("I")
+        self.end_line = array("I")
+        self.end_column = array("I")
+        self.first = array("I")
+        self.edges = array("i")
+        self.token_kind = array("b")
+        self.token_value = array("I")
+        # start line, start column, end line, end column per node
+        self.token_span = array("I")
+        self.attributes: dict[str, list[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.type)
+
+    @classmethod
+    def from_tree(
+        cls, tree: asts.AST, names: NameTable | None = None
+    ) -> "Arena":
+        arena = cls(names)
+        arena._add(tree, -1)
+        return arena
+
+    def _add(self, root: asts.AST, parent: int) -> int:
+        # children are numbered after their parent, and their edges are
+        # written before the parent's. On an explicit stack, one frame per
+        # open node: its number, what goes in its edges (numbers, or nodes
+        # still to add), how far along that it is and the edges so far, so
+        # depth is bounded by memory as with parse.ExplicitStack
+        top = self._open(root, parent)
+        stack: list[list[Any]] = [[top, self._plan(root), 0, []]]
+        while stack:
+            frame = stack[-1]
+            i, plan, at, edges = frame
+            while at < len(plan):
+                item = plan[at]
+                at += 1
+                if type(item) is int:
+                    edges.append(item)
+                    continue
+                child = self._open(item, i)
+                edges.append(child)
+                frame[2] = at
+                stack.append([child, self._plan(item), 0, []])
+                break
+            else:
+                self.first[i] = len(self.edges)
+                self.edges.extend(edges)
+                stack.pop()
+        return top
+
+    def _open(self, node: asts.AST, parent: int) -> int:
+        # numbers node and stores all of it but its edges
+        i = len(self.type)
+        kind = TYPE_ID[type(node)]
+        span = node.span
+        self.type.append(kind)
+        self.parent.append(parent)
+        self.line.append(span.start.line)
+        self.column.append(span.start.column)
+        self.end_line.append(span.end.line)
+        self.end_column.append(span.end.column)
+        self.first.append(0)
+        self.token_kind.append(-1)
+        self.token_value.append(0)
+        self.token_span.extend((0, 0, 0, 0))
+        for name, how in _LAYOUT[kind]:
+            value = getattr(node, name)
+            if how == _TOKEN and value is not None:
+                self.token_kind[i] = KIND_ID[value.kind]
+                self.token_value[i] = self.names.id(value.value)
+                start, end = value.span.start, value.span.end
+                self.token_span[4 * i : 4 * i + 4] = array(
+                    "I", (start.line, start.column, end.line, end.column)
+                )
+        return i
+
+    def _plan(self, node: asts.AST) -> list[Any]:
+        # node's edges in order: -1 for None, a list's length, or a child
+        plan: list[Any] = []
+        for name, how in _LAYOUT[TYPE_ID[type(node)]]:
+            value = getattr(node, name)
+            if how == _NODE:
+                plan.append(-1 if value is None else value)
+            elif how == _LIST:
+                plan.append(len(value))
+                plan.extend(value)
+        return plan
+
+    def children(self, i: int) -> list[int]:
+        # child node numbers in field order, list lengths and Nones left out
+        out = []
+        edges = self.edges
+        e = self.first[i]
+        for _, how in _LAYOUT[self.type[i]]:
+            if how == _NODE:
+                if edges[e] >= 0:
+                    out.append(edges[e])
+                e += 1
+            elif how == _LIST:
+                count = edges[e]
+                out.extend(edges[e + 1 : e + 1 + count])
+                e += 1 + count
+        return out
+
+    def of_type(self, cls: type) -> Iterator[int]:
+        kind = TYPE_ID[cls]
+        return (i for i, t in enumerate(self.type) if t == kind)
+
+    def span(self, i: int) -> Span:
+        return Span(
+            Coord(self.line[i], self.column[i]),
+            Coord(self.end_line[i], self.end_column[i]),
+        )
+
+    def token(self, i: int) -> Token | None:
+        kind = self.token_kind[i]
+        if kind < 0:
+            return None
+        line, column, end_line, end_column = self.token_span[4 * i : 4 * i + 4]
+        return Token(
+            KINDS[kind],
+            self.names.name(self.token_value[i]),
+            Span(Coord(line, column), Coord(end_line, end_column)),
+        )
+
+    def attribute(self, name: str) -> list[Any]:
+        # the list for a pass attribute such as "register" or "size", None
+        # for every node until the pass fills it in
+        values = self.attributes.get(name)
+        if values is None:
+            values = self.attributes[name] = [None] * len(self.type)
+        return values
+
+    def node(self, i: int = 0) -> asts.AST:
+        # rebuilds the subtree of node i as tau.asts objects. In preorder
+        # the subtree is i up to the first node whose parent comes before
+        # i, and every child comes after its parent, so building from the
+        # subtree's last node back needs no recursion
+        end = i + 1
+        while end < len(self.type) and self.parent[end] >= i:
+            end += 1
+        built: dict[int, asts.AST] = {}
+        edges = self.edges
+        for k in range(end - 1, i - 1, -1):
+            values: dict[str, Any] = {"span": self.span(k)}
+            e = self.first[k]
+            for name, how in _LAYOUT[self.type[k]]:
+                if how == _TOKEN:
+                    values[name] = self.token(k)
+                elif how == _VALUE:
+                    values[name] = KINDS[self.token_kind[k]] == "true"
+                elif how == _NODE:
+                    values[name] = None if edges[e] < 0 else built.pop(edges[e])
+                    e += 1
+                else:
+                    count = edges[e]
+                    items = edges[e + 1 : e + 1 + count]
+                    values[name] = [built.pop(c) for c in items]
+                    e += 1 + count
+            built[k] = NODE_TYPES[self.type[k]](**values)
+        return built[i]
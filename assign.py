@@ -3,12 +3,31 @@
 
 from tau import asts
 
+import dispatch
+import walker
+
+
+# Registers are numbered Sethi-Ullman style. Each expression is first
+# labelled bottom-up with
+#   ast.need : int          registers it takes to evaluate
+#   ast.calls : bool        whether it contains a call
+#   ast.right_first : bool  (BinaryOp, ArrayCell) evaluate right/idx first
+# then numbered top-down from the statement: an expression evaluated at
+# base k leaves its value in "r<k>", its first operand is evaluated at k and
+# its second at k + 1. Evaluating the operand that needs more registers
+# first keeps the total at need. An operand containing a call goes first
+# too, so no register is live across the call, unless both contain calls,
+# which then run left to right as written. What is live across a call is
+# r1 to r<k - 1> for a call at base k, set as
+#   ast.live : list[str]    (CallExpr) registers codegen saves around it
+
 
 class Context:
     register_pool: list[str]
 
     def __init__(self) -> None:
-        self.curr_register = 1
+        # the highest register number used in the current function
+        self.registers = 0
 
 
 def process(ast: asts.Program) -> None:
@@ -19,30 +38,26 @@ def _Program(ast: asts.Program) -> None:
     # ast.register_pool : list[str]
     ctx = Context()  # <--- fix this!!
     for decl in ast.decls:
-        ctx.register_pool = []
         _FuncDecl(decl, ctx)
-        ctx.curr_register = 1
 
 
 def _Decl(ast: asts.Decl, ctx: Context) -> None:
-    match ast:
-        case asts.FuncDecl():
-            _FuncDecl(ast, ctx)
-        case asts.ParamDecl():
-            _ParamDecl(ast, ctx)
-        case asts.VarDecl():
-            _VarDecl(ast, ctx)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
+    _DECL[type(ast)](ast, ctx)
 
 
 def _FuncDecl(ast: asts.FuncDecl, ctx: Context) -> None:
     # ast.id : Id
     # ast.ret_type_ast : TypeAST
-    # ast.register_pool : list[str]
+    # ast.register_pool : list[str] <--- set this!!
+    ctx.registers = 0
     for param in ast.params:
         _ParamDecl(param, ctx)
     _CompoundStmt(ast.body, ctx)
+    _pool(ast, ctx)
+
+
+def _pool(ast: asts.FuncDecl, ctx: Context) -> None:
+    ast.register_pool = [f"r{i}" for i in range(1, ctx.registers + 1)]
 
 
 def _ParamDecl(ast: asts.ParamDecl, ctx: Context) -> None:
@@ -58,44 +73,41 @@ def _VarDecl(ast: asts.VarDecl, ctx: Context) -> None:
 
 
 def _Stmt(ast: asts.Stmt, ctx: Context) -> None:
-    match ast:
-        case asts.AssignStmt():
-            _AssignStmt(ast, ctx)
-        case asts.CallStmt():
-            _CallStmt(ast, ctx)
-        case asts.CompoundStmt():
-            _CompoundStmt(ast, ctx)
-        case asts.IfStmt():
-            _IfStmt(ast, ctx)
-        case asts.PrintStmt():
-            _PrintStmt(ast, ctx)
-        case asts.ReturnStmt():
-            _ReturnStmt(ast, ctx)
-        case asts.WhileStmt():
-            _WhileStmt(ast, ctx)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
+    _STMT[type(ast)](ast, ctx)
 
 
 def _AssignStmt(ast: asts.AssignStmt, ctx: Context) -> None:
     _Expr(ast.lhs, ctx)
     _Expr(ast.rhs, ctx)
+    _assign(ast, ctx)
+
+
+def _assign(ast: asts.AssignStmt, ctx: Context) -> None:
+    # codegen computes a cell's address before the value, and a variable's
+    # address after it; either way the one computed first stays in r1
+    if type(ast.lhs) is asts.ArrayCell:
+        _number(ast.lhs, 1, ctx)
+        _number(ast.rhs, 2, ctx)
+    else:
+        _number(ast.rhs, 1, ctx)
+        _number(ast.lhs, 2, ctx)
 
 
 def _CallStmt(ast: asts.CallStmt, ctx: Context) -> None:
     _CallExpr(ast.call, ctx)
+    _number(ast.call, 1, ctx)
 
 
 def _CompoundStmt(ast: asts.CompoundStmt, ctx: Context) -> None:
     for decl in ast.decls:
         _VarDecl(decl, ctx)
     for stmt in ast.stmts:
-        ctx.curr_register = 1
         _Stmt(stmt, ctx)
 
 
 def _IfStmt(ast: asts.IfStmt, ctx: Context) -> None:
     _Expr(ast.expr, ctx)
+    _number(ast.expr, 1, ctx)
     _CompoundStmt(ast.thenStmt, ctx)
     if ast.elseStmt:
         _CompoundStmt(ast.elseStmt, ctx)
@@ -103,86 +115,212 @@ def _IfStmt(ast: asts.IfStmt, ctx: Context) -> None:
 
 def _PrintStmt(ast: asts.PrintStmt, ctx: Context) -> None:
     _Expr(ast.expr, ctx)
+    _number(ast.expr, 1, ctx)
 
 
 def _ReturnStmt(ast: asts.ReturnStmt, ctx: Context) -> None:
     if ast.expr:
         _Expr(ast.expr, ctx)
+        _number(ast.expr, 1, ctx)
 
 
 def _WhileStmt(ast: asts.WhileStmt, ctx: Context) -> None:
     _Expr(ast.expr, ctx)
+    _number(ast.expr, 1, ctx)
     _CompoundStmt(ast.stmt, ctx)
 
 
 def _Expr(ast: asts.Expr, ctx: Context) -> None:
-    match ast:
-        case asts.ArrayCell():
-            _ArrayCell(ast, ctx)
-        case asts.BinaryOp():
-            _BinaryOp(ast, ctx)
-        case asts.BoolLiteral():
-            _BoolLiteral(ast, ctx)
-        case asts.CallExpr():
-            _CallExpr(ast, ctx)
-        case asts.IdExpr():
-            _IdExpr(ast, ctx)
-        case asts.IntLiteral():
-            _IntLiteral(ast, ctx)
-        case asts.UnaryOp():
-            _UnaryOp(ast, ctx)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
+    _EXPR[type(ast)](ast, ctx)
 
 
 def _ArrayCell(ast: asts.ArrayCell, ctx: Context) -> None:
-    # ast.register : str <--- set this!!
-    ast.register = "r" + str(ctx.curr_register)
     _Expr(ast.arr, ctx)
     _Expr(ast.idx, ctx)
+    _operands(ast, ast.arr, ast.idx)
 
 
 def _BinaryOp(ast: asts.BinaryOp, ctx: Context) -> None:
-    # ast.register : str <--- set this!!
-    ast.register = "r" + str(ctx.curr_register)
     _Expr(ast.left, ctx)
     _Expr(ast.right, ctx)
-    ctx.curr_register -= 1
+    _binary_op(ast)
+
+
+def _binary_op(ast: asts.BinaryOp) -> None:
+    if ast.op.value in {"and", "or"}:
+        # the left operand is dead once tested, so the right one can reuse
+        # its registers; the order is the language's
+        ast.need = max(ast.left.need, ast.right.need)
+        ast.calls = ast.left.calls or ast.right.calls
+        ast.right_first = False
+    else:
+        _operands(ast, ast.left, ast.right)
+
+
+def _operands(ast: asts.Expr, left: asts.Expr, right: asts.Expr) -> None:
+    ast.calls = left.calls or right.calls
+    if left.calls and right.calls:
+        ast.right_first = False
+    else:
+        ast.right_first = (right.calls, right.need) > (left.calls, left.need)
+    first, second = (right, left) if ast.right_first else (left, right)
+    ast.need = max(first.need, second.need + 1)
 
 
 def _BoolLiteral(ast: asts.BoolLiteral, ctx: Context) -> None:
-    # ast.register : str <--- set this!!
-    ast.register = "r" + str(ctx.curr_register)
-    ctx.curr_register += 1
+    _leaf(ast)
 
 
 def _CallExpr(ast: asts.CallExpr, ctx: Context) -> None:
-    # ast.register : str <--- set this!!
-    ast.register = "r" + str(ctx.curr_register)
     _Expr(ast.fn, ctx)
     for arg in ast.args:
         _Argument(arg, ctx)
-        ctx.curr_register -= 1
+    _call(ast)
+
+
+def _call(ast: asts.CallExpr) -> None:
+    # each argument is stored as soon as it is computed, so all of them
+    # can use the registers the call's value ends up in
+    ast.need = max([1] + [arg.expr.need for arg in ast.args])
+    ast.calls = True
 
 
 def _IdExpr(ast: asts.IdExpr, ctx: Context) -> None:
-    # ast.register : str <--- set this!!
     # ast.id : Id
-    ast.register = "r" + str(ctx.curr_register)
-    ctx.curr_register += 1
+    _leaf(ast)
 
 
 def _IntLiteral(ast: asts.IntLiteral, ctx: Context) -> None:
-    # ast.register : str <--- set this!!
-    ast.register = "r" + str(ctx.curr_register)
-    ctx.curr_register += 1
+    _leaf(ast)
+
+
+def _leaf(ast: asts.Expr) -> None:
+    ast.need = 1
+    ast.calls = False
 
 
 def _UnaryOp(ast: asts.UnaryOp, ctx: Context) -> None:
-    # ast.register : str <--- set this!!
-    ast.register = "r" + str(ctx.curr_register)
     _Expr(ast.expr, ctx)
+    _unary_op(ast)
+
+
+def _unary_op(ast: asts.UnaryOp) -> None:
+    ast.need = ast.expr.need
+    ast.calls = ast.expr.calls
 
 
 def _Argument(ast: asts.Argument, ctx: Context) -> None:
     _Expr(ast.expr, ctx)
+
+
+def _number(ast: asts.Expr, base: int, ctx: Context) -> None:
+    # ast.register : str <--- set this!!
+    ast.register = "r" + str(base)
+    if base > ctx.registers:
+        ctx.registers = base
+    _NUMBER[type(ast)](ast, base, ctx)
+
+
+def _number_ArrayCell(ast: asts.ArrayCell, base: int, ctx: Context) -> None:
+    _number_operands(ast.arr, ast.idx, ast.right_first, base, ctx)
+
+
+def _number_BinaryOp(ast: asts.BinaryOp, base: int, ctx: Context) -> None:
+    if ast.op.value in {"and", "or"}:
+        _number(ast.left, base, ctx)
+        _number(ast.right, base, ctx)
+    else:
+        _number_operands(ast.left, ast.right, ast.right_first, base, ctx)
+
+
+def _number_operands(
+    left: asts.Expr, right: asts.Expr, right_first: bool, base: int, ctx: Context
+) -> None:
+    first, second = (right, left) if right_first else (left, right)
+    _number(first, base, ctx)
+    _number(second, base + 1, ctx)
+
+
+def _number_BoolLiteral(ast: asts.BoolLiteral, base: int, ctx: Context) -> None:
+    pass
+
+
+def _number_CallExpr(ast: asts.CallExpr, base: int, ctx: Context) -> None:
+    # every step up from base 1 left the first operand's value behind
+    ast.live = [f"r{i}" for i in range(1, base)]
+    _number(ast.fn, base, ctx)
+    for arg in ast.args:
+        _number(arg.expr, base, ctx)
+
+
+def _number_IdExpr(ast: asts.IdExpr, base: int, ctx: Context) -> None:
+    pass
+
+
+def _number_IntLiteral(ast: asts.IntLiteral, base: int, ctx: Context) -> None:
+    pass
+
+
+def _number_UnaryOp(ast: asts.UnaryOp, base: int, ctx: Context) -> None:
+    _number(ast.expr, base, ctx)
+
+
+_DECL = dispatch.Dispatch(asts.Decl, globals())
+_STMT = dispatch.Dispatch(asts.Stmt, globals())
+_EXPR = dispatch.Dispatch(asts.Expr, globals())
+_NUMBER = dispatch.Dispatch(asts.Expr, globals(), "_number_")
+
+
+class Visitor(walker.Visitor):
+    # the same pass as hooks for a walker.Walker: expressions are labelled
+    # as they are exited, and numbered when the statement holding them is
+    ctx: Context
+
+    def __init__(self) -> None:
+        self.ctx = Context()
+
+    def enter_FuncDecl(self, ast: asts.FuncDecl, parent: asts.AST) -> None:
+        self.ctx.registers = 0
+
+    def exit_FuncDecl(self, ast: asts.FuncDecl, parent: asts.AST) -> None:
+        _pool(ast, self.ctx)
+
+    def exit_ArrayCell(self, ast: asts.ArrayCell, parent: asts.AST) -> None:
+        _operands(ast, ast.arr, ast.idx)
+
+    def exit_BinaryOp(self, ast: asts.BinaryOp, parent: asts.AST) -> None:
+        _binary_op(ast)
+
+    def exit_CallExpr(self, ast: asts.CallExpr, parent: asts.AST) -> None:
+        _call(ast)
+
+    def exit_UnaryOp(self, ast: asts.UnaryOp, parent: asts.AST) -> None:
+        _unary_op(ast)
+
+    def exit_BoolLiteral(self, ast: asts.BoolLiteral, parent: asts.AST) -> None:
+        _leaf(ast)
+
+    def exit_IdExpr(self, ast: asts.IdExpr, parent: asts.AST) -> None:
+        _leaf(ast)
+
+    def exit_IntLiteral(self, ast: asts.IntLiteral, parent: asts.AST) -> None:
+        _leaf(ast)
+
+    def exit_AssignStmt(self, ast: asts.AssignStmt, parent: asts.AST) -> None:
+        _assign(ast, self.ctx)
+
+    def exit_CallStmt(self, ast: asts.CallStmt, parent: asts.AST) -> None:
+        _number(ast.call, 1, self.ctx)
+
+    def exit_PrintStmt(self, ast: asts.PrintStmt, parent: asts.AST) -> None:
+        _number(ast.expr, 1, self.ctx)
+
+    def exit_ReturnStmt(self, ast: asts.ReturnStmt, parent: asts.AST) -> None:
+        if ast.expr:
+            _number(ast.expr, 1, self.ctx)
+
+    def exit_IfStmt(self, ast: asts.IfStmt, parent: asts.AST) -> None:
+        _number(ast.expr, 1, self.ctx)
+
+    def exit_WhileStmt(self, ast: asts.WhileStmt, parent: asts.AST) -> None:
+        _number(ast.expr, 1, self.ctx)
@@ -0,0 +1,754 @@
+import argparse
+import gc
+import random
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from tau.tokens import Token
+from tau import asts
+from typing import Iterator
+from vm.vm_insns import *
+
+import arena
+import bench_baseline
+import codegen
+import incremental
+import parallel
+import parse
+import scanner
+import semantic
+
+
+def generate(functions: int, seed: int = 453) -> str:
+    # builds a well-formed Tau program; every function only calls functions
+    # declared before it, so the program passes bindings and typecheck
+    rng = random.Random(seed)
+    out: list[str] = []
+
+    def expr(names: list[str], callees: list[tuple[str, int]], depth: int) -> str:
+        if depth <= 0 or rng.random() < 0.3:
+            if names and rng.random() < 0.6:
+                return rng.choice(names)
+            return str(rng.randint(0, 99))
+        choice = rng.random()
+        if choice < 0.1:
+            return "-" + expr(names, callees, depth - 1)
+        if choice < 0.2:
+            return "(" + expr(names, callees, depth - 1) + ")"
+        if choice < 0.3 and callees:
+            name, arity = rng.choice(callees)
+            args = ", ".join(expr(names, [], depth - 1) for _ in range(arity))
+            return f"{name}({args})"
+        if choice < 0.4:
+            return expr(names, callees, depth - 1) + " / " + str(rng.randint(1, 9))
+        op = rng.choice(["+", "-", "*"])
+        left = expr(names, callees, depth - 1)
+        return left + f" {op} " + expr(names, callees, depth - 1)
+
+    def cond(names: list[str], depth: int) -> str:
+        op = rng.choice(["<", "<=", "==", "!=", ">", ">="])
+        text = expr(names, [], depth) + f" {op} " + expr(names, [], depth)
+        if rng.random() < 0.3:
+            text = "not (" + text + ")"
+        if rng.random() < 0.3:
+            text += rng.choice([" and ", " or "]) + rng.choice(["true", "false"])
+        return text
+
+    def block(names, callees, indent: int, depth: int) -> list[str]:
+        # lines of a compound statement body, ending with its closing brace;
+        # the caller puts the opening brace at the end of its own line
+        pad = "    " * indent
+        lines = []
+        local = list(names)
+        for _ in range(rng.randint(0, 3)):
+            name = f"v{len(local)}"
+            lines.append(f"{pad}var {name}: int")
+            lines.append(f"{pad}{name} = {expr(local, callees, 3)}")
+            local.append(name)
+        for _ in range(rng.randint(1, 5)):
+            choice = rng.random()
+            if choice < 0.4 and local:
+                lines.append(f"{pad}{rng.choice(local)} = {expr(local, callees, 4)}")
+            elif choice < 0.6:
+                lines.append(f"{pad}print {expr(local, callees, 3)}")
+            elif choice < 0.75 and depth > 0:
+                lines.append(f"{pad}if {cond(local, 2)} {{")
+                lines.extend(block(local, callees, indent + 1, depth - 1))
+                if rng.random() < 0.5:
+                    lines[-1] += " else {"
+                    lines.extend(block(local, callees, indent + 1, depth - 1))
+            elif choice < 0.85 and depth > 0:
+                counter = f"w{indent}"
+                lines.append(f"{pad}{{")
+                lines.append(f"{pad}    var {counter}: int")
+                lines.append(f"{pad}    {counter} = 0")
+                lines.append(f"{pad}    while {counter} < {rng.randint(1, 4)} {{")
+                lines.append(f"{pad}        {counter} = {counter} + 1")
+                lines.extend(block(local, callees, indent + 2, depth - 1))
+                lines.append(f"{pad}}}")
+            elif callees:
+                name, arity = rng.choice(callees)
+                args = ", ".join(expr(local, [], 2) for _ in range(arity))
+                lines.append(f"{pad}call {name}({args})")
+        lines.append(pad[4:] + "}")
+        return lines
+
+    callees: list[tuple[str, int]] = []
+    for n in range(functions):
+        arity = rng.randint(0, 3)
+        params = [f"p{i}" for i in range(arity)]
+        out.append(f"// generated function {n}")
+        header = ", ".join(f"{p}: int" for p in params)
+        out.append(f"func f{n}({header}): int {{")
+        body = block(params, callees, 1, 2)
+        body.insert(-1, f"    return {expr(params, callees, 3)}")
+        out.extend(body)
+        out.append("")
+        callees.append((f"f{n}", arity))
+    out.append("func main(): void {")
+    out.extend(block([], callees, 1, 2))
+    return "\n".join(out) + "\n"
+
+
+def generate_expressions(statements: int, seed: int = 453) -> str:
+    # one long function of deep arithmetic and boolean expressions
+    rng = random.Random(seed)
+    names = ["a", "b", "c", "d"]
+
+    def expr(depth: int) -> str:
+        if depth <= 0 or rng.random() < 0.15:
+            return rng.choice(names + [str(rng.randint(0, 9))])
+        op = rng.choice(["+", "-", "*", "/"])
+        text = expr(depth - 1) + f" {op} " + expr(depth - 1)
+        return "(" + text + ")" if rng.random() < 0.3 else text
+
+    lines = ["func main(): void {"]
+    lines.extend(f"    var {name}: int" for name in names)
+    lines.extend(f"    {name} = {i + 1}" for i, name in enumerate(names))
+    for _ in range(statements):
+        if rng.random() < 0.2:
+            compare = rng.choice(["<", "==", ">="])
+            test = f"{expr(3)} {compare} {expr(3)} or not ({expr(2)} != a)"
+            lines.append(f"    if {test} {{")
+            lines.append(f"        {rng.choice(names)} = {expr(4)}")
+            lines.append("    }")
+        else:
+            lines.append(f"    {rng.choice(names)} = {expr(6)}")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_scan(source: str, repeat: int) -> None:
+    tokens = scanner.Scanner(source).tokens
+    if tokens != bench_baseline.CharScanner(source).tokens:
+        sys.exit("scanner output differs from the character-loop baseline")
+    old = _best(lambda: bench_baseline.CharScanner(source), repeat)
+    new = _best(lambda: scanner.Scanner(source), repeat)
+    print(f"{len(source)} chars, {len(tokens)} tokens")
+    print(f"char loop : {len(tokens) / old:12,.0f} tokens/s")
+    print(f"scanner   : {len(tokens) / new:12,.0f} tokens/s  ({old / new:.2f}x)")
+
+
+def _peak(fn) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_stream(source: str, repeat: int) -> None:
+    # the AST itself is the same either way; the difference is the token list
+    eager = _peak(lambda: parse.Parser(scanner.Scanner(source)).parse())
+    lazy = _peak(lambda: parse.Parser(scanner.Scanner(source, lazy=True)).parse())
+    print(f"eager tokens : {eager / 2**20:8.1f} MiB peak")
+    print(f"lazy tokens  : {lazy / 2**20:8.1f} MiB peak")
+
+
+def _retained(build) -> tuple[int, object]:
+    tracemalloc.start()
+    try:
+        kept = build()
+        return tracemalloc.get_traced_memory()[0], kept
+    finally:
+        tracemalloc.stop()
+
+
+def bench_tokens(source: str, repeat: int) -> None:
+    listed, tokens = _retained(lambda: scanner.Scanner(source).tokens)
+    packed, buffer = _retained(lambda: scanner.TokenBuffer(source))
+    count = len(tokens)
+    print(f"{count} tokens")
+    print(f"list[Token] : {listed / 2**20:8.1f} MiB  {listed / count:6.1f} B/token")
+    print(f"TokenBuffer : {packed / 2**20:8.1f} MiB  {packed / count:6.1f} B/token")
+    eager = _best(lambda: parse.Parser(scanner.Scanner(source)).parse(), repeat)
+    buffered = _best(
+        lambda: parse.BufferParser(scanner.TokenBuffer(source)).parse(), repeat
+    )
+    print(f"scan+parse list   : {eager:8.3f} s")
+    print(f"scan+parse buffer : {buffered:8.3f} s")
+
+
+def bench_parse(source: str, repeat: int) -> None:
+    for name, text in (
+        ("program", source),
+        ("expressions", generate_expressions(len(source) // 400)),
+    ):
+        tokens = scanner.Scanner(text).tokens
+        if parse.Parser(tokens).parse() != bench_baseline.StringParser(tokens).parse():
+            sys.exit(f"{name}: parse differs from the string-kind baseline")
+        # collections triggered by the AST allocations swamp the difference
+        gc.disable()
+        try:
+            old = _best(lambda: bench_baseline.StringParser(tokens).parse(), repeat)
+            new = _best(lambda: parse.Parser(tokens).parse(), repeat)
+        finally:
+            gc.enable()
+        print(f"{name}: {len(tokens)} tokens")
+        print(f"  string kinds : {len(tokens) / old:12,.0f} tokens/s")
+        speedup = f"({old / new:.2f}x)"
+        print(f"  bitmasks     : {len(tokens) / new:12,.0f} tokens/s  {speedup}")
+
+
+def bench_relex(source: str, repeat: int) -> None:
+    # a one-character edit in the middle, and a new line near the top that
+    # moves every later token down
+    tokens = scanner.Scanner(source).tokens
+    middle = source.index("return", len(source) // 2)
+    for name, offset, text in (("char", middle, "x"), ("newline", 10, "\n")):
+        edited = source[:offset] + text + source[offset:]
+        full = _best(lambda: scanner.Scanner(edited), repeat)
+        edit = _best(lambda: scanner.relex(source, tokens, offset, 0, text), repeat)
+        result = scanner.relex(source, tokens, offset, 0, text)
+        changed = f"{result.start}:{result.end} of {len(result.tokens)}"
+        print(f"{name}: relexed tokens {changed}")
+        print(f"  full rescan : {full:8.4f} s")
+        print(f"  relex       : {edit:8.4f} s")
+
+
+def bench_incremental(source: str, repeat: int) -> None:
+    # edit-to-AST time after a new line near the top (every function moves)
+    # and after an edit inside one function in the middle
+    scan = scanner.Scanner(source)
+    full = _best(lambda: parse.Parser(scan.tokens).parse(), repeat)
+    print(f"full parse   : {full:8.4f} s")
+    inc = incremental.IncrementalParser()
+    inc.parse(scan.input, scan.tokens)
+    for name, text in (("newline", "\n"), ("expression", "1 + ")):
+        offset = 0
+        if name == "expression":
+            offset = scan.input.index("return ", len(scan.input) // 2) + 7
+        scan.edit(offset, 0, text)
+        start = time.perf_counter()
+        tree = inc.parse(scan.input, scan.tokens)
+        seconds = time.perf_counter() - start
+        if tree != parse.Parser(scan.tokens).parse():
+            sys.exit(f"{name}: incremental parse differs from a full parse")
+        print(
+            f"{name:13}: {seconds:8.4f} s  "
+            f"({inc.parsed} parsed, {inc.reused} reused)"
+        )
+
+
+def bench_rebuild(source: str, repeat: int) -> None:
+    # semantic analysis and codegen of the edited program from scratch and
+    # with an IncrementalCompiler, after the same edits as bench_incremental
+    scan = scanner.Scanner(source)
+    inc = incremental.IncrementalParser()
+    compiler = incremental.IncrementalCompiler()
+    compiler.compile(inc.parse(scan.input, scan.tokens))
+    for name, text in (("newline", "\n"), ("expression", "1 + ")):
+        offset = 0
+        if name == "expression":
+            offset = scan.input.index("return ", len(scan.input) // 2) + 7
+        scan.edit(offset, 0, text)
+        tree = inc.parse(scan.input, scan.tokens)
+        start = time.perf_counter()
+        insns = compiler.compile(tree)
+        seconds = time.perf_counter() - start
+        fresh = parse.Parser(scan.tokens).parse()
+        start = time.perf_counter()
+        semantic.process(fresh)
+        if insns != codegen.process(fresh):
+            sys.exit(f"{name}: incremental code differs from a full compile")
+        full = time.perf_counter() - start
+        print(
+            f"{name:13}: {seconds:8.4f} s, full {full:8.4f} s  "
+            f"({compiler.compiled} compiled, {compiler.reused} reused)"
+        )
+
+
+def bench_parallel(source: str, repeat: int) -> None:
+    # scan + parse of one big file, serially and split over worker processes
+    tree = parse.Parser(scanner.Scanner(source)).parse()
+    if parallel.parse_parallel(source) != tree:
+        sys.exit("parallel parse differs from the serial one")
+    serial = _best(lambda: parse.Parser(scanner.Scanner(source)).parse(), repeat)
+    print(f"serial       : {serial:8.3f} s")
+    for workers in sorted({1, 2, os.cpu_count() or 1}):
+        seconds = _best(lambda: parallel.parse_parallel(source, workers), repeat)
+        print(f"{workers:2} workers   : {seconds:8.3f} s  ({serial / seconds:.2f}x)")
+
+
+def _walk(tree: object) -> Iterator[object]:
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(_children(node)))
+
+
+def bench_arena(source: str, repeat: int) -> None:
+    # memory kept per node and the time of a whole-tree walk that reads a
+    # pass attribute, for tau.asts objects and for the array-backed Arena
+    tree = parse.Parser(scanner.Scanner(source)).parse()
+    objects, tree = _retained(lambda: parse.Parser(scanner.Scanner(source)).parse())
+    packed, nodes = _retained(lambda: arena.Arena.from_tree(tree))
+    count = len(nodes)
+    print(f"{count} nodes")
+    print(f"tau.asts : {objects / 2**20:8.1f} MiB  {objects / count:6.1f} B/node")
+    print(f"Arena    : {packed / 2**20:8.1f} MiB  {packed / count:6.1f} B/node")
+
+    for node in _walk(tree):
+        node.register = 0
+    registers = nodes.attribute("register")
+    for i in range(count):
+        registers[i] = 0
+    binary_op = arena.TYPE_ID[asts.BinaryOp]
+
+    def walk_objects() -> int:
+        return sum(
+            node.register for node in _walk(tree) if type(node) is asts.BinaryOp
+        )
+
+    def walk_arena() -> int:
+        return sum(r for t, r in zip(nodes.type, registers) if t == binary_op)
+
+    old = _best(walk_objects, repeat)
+    new = _best(walk_arena, repeat)
+    print(f"walk tau.asts : {old:8.4f} s")
+    print(f"walk Arena    : {new:8.4f} s  ({old / new:.1f}x)")
+
+
+def bench_mapped(source: str, repeat: int) -> None:
+    with tempfile.NamedTemporaryFile("w", suffix=".tau", delete=False) as f:
+        f.write(source)
+    try:
+        with scanner.MappedSource(f.name) as mapped:
+            offsets = _best(lambda: list(mapped.offsets()), repeat)
+            offsets_peak = _peak(lambda: list(mapped.offsets()))
+        tokens = _best(lambda: scanner.Scanner(source), repeat)
+        tokens_peak = _peak(lambda: scanner.Scanner(source))
+    finally:
+        os.unlink(f.name)
+    print(f"Scanner      : {tokens:8.3f} s  {tokens_peak / 2**20:8.1f} MiB peak")
+    print(f"MappedSource : {offsets:8.3f} s  {offsets_peak / 2**20:8.1f} MiB peak")
+
+
+def nested(shape: str, depth: int) -> str:
+    # a single program nesting one construct depth times
+    if shape == "blocks":
+        body = "{ " * depth + "print 1" + " }" * depth
+    elif shape == "ifs":
+        body = "if a { " * depth + "print 1" + " } else { print 2 }" * depth
+    elif shape == "whiles":
+        body = "while a { " * depth + "print 1" + " }" * depth
+    elif shape == "parens":
+        body = "print " + "(" * depth + "1" + ")" * depth
+    elif shape == "unary":
+        body = "print " + "not - " * (depth // 2) + "a"
+    elif shape == "calls":
+        body = "print " + "f(1, " * depth + "1" + ")" * depth
+    elif shape == "indexes":
+        body = "print " + "a[" * depth + "1" + "]" * depth
+    else:
+        body = "print 1" + " + (2 * 3" * depth + ")" * depth
+    return "func main(): void { " + body + " }\n"
+
+
+SHAPES = ("blocks", "ifs", "whiles", "parens", "unary", "calls", "indexes", "binary")
+
+# tree height of nested(shape, depth) is per_level * depth + extra
+_HEIGHTS = {
+    "blocks": (1, 6),
+    "ifs": (2, 6),
+    "whiles": (2, 6),
+    "parens": (0, 6),
+    "unary": (1, 7),
+    "calls": (2, 6),
+    "indexes": (1, 7),
+    "binary": (1, 7),
+}
+
+
+def _children(node: object) -> list:
+    children = []
+    for child in vars(node).values():
+        if isinstance(child, list):
+            children.extend(child)
+        elif hasattr(child, "__dataclass_fields__") and hasattr(child, "span"):
+            children.append(child)
+    return children
+
+
+def _height(tree: object) -> int:
+    # iterative, since the trees here are too deep for a recursive walk
+    # (including the dataclass __eq__ and __repr__)
+    height = 0
+    stack = [(tree, 1)]
+    while stack:
+        node, level = stack.pop()
+        height = max(height, level)
+        stack.extend((child, level + 1) for child in _children(node))
+    return height
+
+
+def _same(a: object, b: object) -> bool:
+    # iterative ==, comparing node types, spans and tokens
+    stack = [(a, b)]
+    while stack:
+        x, y = stack.pop()
+        if type(x) is not type(y) or x.span != y.span:
+            return False
+        if getattr(x, "token", None) != getattr(y, "token", None):
+            return False
+        if getattr(x, "op", None) != getattr(y, "op", None):
+            return False
+        xs, ys = _children(x), _children(y)
+        if len(xs) != len(ys):
+            return False
+        stack.extend(zip(xs, ys))
+    return True
+
+
+def check_deep(depth: int = 20_000) -> None:
+    # the explicit-stack parsers must agree with the recursive ones where
+    # both work, and with each other far past the recursion limit
+    for shape in SHAPES:
+        text = nested(shape, 50)
+        tree = parse.Parser(scanner.Scanner(text)).parse()
+        assert parse.DeepParser(scanner.Scanner(text)).parse() == tree, shape
+        buffer = scanner.TokenBuffer(text)
+        assert parse.DeepBufferParser(buffer).parse() == tree, shape
+
+        text = nested(shape, depth)
+        tree = parse.DeepParser(scanner.Scanner(text)).parse()
+        per_level, extra = _HEIGHTS[shape]
+        assert _height(tree) == per_level * depth + extra, shape
+        buffer = scanner.TokenBuffer(text)
+        assert _same(parse.DeepBufferParser(buffer).parse(), tree), shape
+
+
+def bench_deep(source: str, repeat: int) -> None:
+    check_deep()
+    for depth in (10_000, 100_000):
+        for shape in SHAPES:
+            tokens = scanner.Scanner(nested(shape, depth)).tokens
+            try:
+                parse.Parser(tokens).parse()
+                recursive = "ok"
+            except RecursionError:
+                recursive = "RecursionError"
+            seconds = _best(lambda: parse.DeepParser(tokens).parse(), repeat)
+            print(f"{shape:8} {depth:7,}: {seconds:7.3f} s, recursive: {recursive}")
+
+
+_ARRAYS = """
+func fill(a: []int, n: int, seed: int): void {
+    var i: int
+    i = 0
+    while i < n {
+        seed = (seed * 37 + 11) - (seed * 37 + 11) / 1009 * 1009
+        a[i] = seed
+        i = i + 1
+    }
+}
+func sum(a: []int, n: int): int {
+    var i: int
+    var s: int
+    i = 0
+    s = 0
+    while i < n {
+        s = s + a[i]
+        i = i + 1
+    }
+    return s
+}
+func sort(a: []int, n: int): void {
+    var i: int
+    var j: int
+    i = 0
+    while i < n {
+        j = 0
+        while j < n - 1 - i {
+            if a[j] > a[j + 1] {
+                var t: int
+                t = a[j]
+                a[j] = a[j + 1]
+                a[j + 1] = t
+            }
+            j = j + 1
+        }
+        i = i + 1
+    }
+}
+"""
+
+
+def arrays(size: int, work: str) -> str:
+    # fills a local [size]int, then runs work ("fill", "sum" or "sort")
+    # on it through an unsized array parameter
+    calls = {"fill": "", "sum": "print sum(xs, N)", "sort": "call sort(xs, N)"}
+    main = (
+        f"func main(): void {{ var xs: [N]int call fill(xs, N, 7) {calls[work]} "
+        "print xs[0] }"
+    )
+    return _ARRAYS + main.replace("N", str(size)) + "\n"
+
+
+_ARITHMETIC = {
+    Add: lambda x, y: x + y,
+    Sub: lambda x, y: x - y,
+    Mul: lambda x, y: x * y,
+    Div: lambda x, y: int(x / y),
+    Equal: lambda x, y: int(x == y),
+    NotEqual: lambda x, y: int(x != y),
+    LessThan: lambda x, y: int(x < y),
+    LessThanEqual: lambda x, y: int(x <= y),
+    GreaterThan: lambda x, y: int(x > y),
+    GreaterThanEqual: lambda x, y: int(x >= y),
+}
+
+
+def execute(insns: list[Insn], limit: int = 10**8) -> tuple[list[int], int]:
+    # runs a program the way the VM does and returns what it printed and
+    # how many instructions it executed. Register "0" always reads 0
+    labels = {insn.label: i for i, insn in enumerate(insns) if type(insn) is Label}
+    regs = {"FP": 0, "SP": 1}
+    memory: dict[int, int] = {}
+    out: list[int] = []
+    pc = steps = 0
+    get = lambda r: 0 if r == "0" else regs.get(r, 0)
+    while steps < limit:
+        insn = insns[pc]
+        cls = type(insn)
+        pc += 1
+        steps += 1
+        if cls in _ARITHMETIC:
+            regs[insn.dst] = _ARITHMETIC[cls](get(insn.x), get(insn.y))
+        elif cls is AddImmediate:
+            regs[insn.dst] = get(insn.x) + insn.value
+        elif cls is Immediate:
+            regs[insn.dst] = insn.value
+        elif cls is Move:
+            regs[insn.dst] = get(insn.x)
+        elif cls is Not:
+            regs[insn.dst] = int(not get(insn.x))
+        elif cls is Load:
+            regs[insn.dst] = memory.get(get(insn.address), 0)
+        elif cls is Store:
+            memory[get(insn.address)] = get(insn.v)
+        elif cls is Print:
+            out.append(get(insn.v))
+        elif cls is Jump:
+            pc = labels[insn.label]
+        elif cls is JumpIfZero:
+            if get(insn.v) == 0:
+                pc = labels[insn.label]
+        elif cls is JumpIfNotZero:
+            if get(insn.v) != 0:
+                pc = labels[insn.label]
+        elif cls is JumpIndirect:
+            pc = get(insn.v)
+        elif cls is Call:
+            regs["RA"] = pc
+            pc = labels[insn.label]
+        elif cls is Halt:
+            return out, steps
+    raise RuntimeError(f"no Halt within {limit} instructions")
+
+
+def _compile(source: str, registers: int | None = None) -> list[Insn]:
+    tree = parse.Parser(scanner.Scanner(source)).parse()
+    semantic.process(tree)
+    return codegen.process(tree, registers)
+
+
+def bench_arrays(source: str, repeat: int) -> None:
+    # VM instructions executed by loops over an array in a caller's frame:
+    # filling it, summing it, and a bubble sort, per element (per element
+    # squared for the sort) beyond the fill
+    for size in (10, 100, 300):
+        counts = {}
+        for work in ("fill", "sum", "sort"):
+            _, counts[work] = execute(_compile(arrays(size, work)))
+        total = counts["sum"] - counts["fill"]
+        sort = counts["sort"] - counts["fill"]
+        print(
+            f"{size:4} elements: fill {counts['fill']:9,}  "
+            f"sum {total:9,} ({total / size:5.1f}/element)  "
+            f"sort {sort:11,} ({sort / size**2:5.1f}/element^2)"
+        )
+
+
+def bench_registers(source: str, repeat: int) -> None:
+    # registers each function's code uses, as assign numbers them
+    tree = parse.Parser(scanner.Scanner(source)).parse()
+    semantic.process(tree)
+    insns = codegen.process(tree)
+    counts: dict[int, int] = {}
+    for decl in tree.decls:
+        registers = len(decl.register_pool)
+        counts[registers] = counts.get(registers, 0) + 1
+    print(f"{len(tree.decls)} functions, {len(insns)} instructions")
+    for registers, functions in sorted(counts.items()):
+        print(f"{registers:3} registers: {functions:6} functions")
+    widest = max(tree.decls, key=lambda decl: len(decl.register_pool))
+    print(f"most: {widest.id.token.value} ({len(widest.register_pool)})")
+
+
+def bench_spills(source: str, repeat: int) -> None:
+    # a bounded register file: instructions the array sort executes, and
+    # the size of source's code and the time to generate it, as fewer
+    # registers leave regalloc more values to spill
+    sort = arrays(50, "sort")
+    tree = parse.Parser(scanner.Scanner(source)).parse()
+    semantic.process(tree)
+    # every function, as main may reach few of them
+    functions = lambda: [codegen.function(d, registers) for d in tree.decls]
+    print("registers  sort executed  code size  codegen")
+    for registers in (None, 8, 4, 3, 2, 1, 0):
+        _, steps = execute(_compile(sort, registers))
+        insns = sum(len(code) for code in functions())
+        gc.disable()
+        try:
+            seconds = _best(functions, repeat)
+        finally:
+            gc.enable()
+        name = "unbounded" if registers is None else str(registers)
+        print(f"{name:>9}  {steps:13,}  {insns:9,}  {seconds:6.3f} s")
+
+
+def _passes(tree: asts.Program) -> None:
+    for phase in semantic.PASSES:
+        phase.process(tree)
+
+
+def bench_semantic(source: str, repeat: int) -> None:
+    # bindings, typecheck, offsets and assign run one after another, and
+    # fused into a single walk. Both leave the same attributes behind
+    tree = parse.Parser(scanner.Scanner(source)).parse()
+    nodes = sum(1 for _ in _walk(tree))
+    gc.disable()
+    try:
+        old = _best(lambda: _passes(tree), repeat)
+        new = _best(lambda: semantic.process(tree), repeat)
+    finally:
+        gc.enable()
+    print(f"{nodes} nodes")
+    print(f"four passes : {old:8.3f} s")
+    print(f"fused       : {new:8.3f} s  ({old / new:.2f}x)")
+    if not semantic.free_threaded():
+        print("threads     : not run, the interpreter has a global lock")
+        return
+    for workers in sorted({2, os.cpu_count() or 1} - {1}):
+        seconds = _best(lambda: semantic.process_parallel(tree, workers), repeat)
+        print(f"{workers:2} threads  : {seconds:8.3f} s  ({old / seconds:.2f}x)")
+
+
+# one program per semantic error, and pairs of errors in different
+# passes where the fused walk meets the later pass's error first
+_ERRORS = [
+    "func main(): void { var x: int var x: int }",
+    "func main(): void { print y }",
+    "func f(): void { } func f(): void { } func main(): void { }",
+    "func main(): void { var x: int x = true }",
+    "func main(): void { call g() }",
+    "func main(): void { while 1 + true { } }",
+    "func main(): void { print not 1 }",
+    "func main(): void { print -true }",
+    "func f(a: int): int { return a } func main(): void { print f(1, 2) }",
+    "func f(): int { return true } func main(): void { }",
+    "func main(): void { var x: int print x[0] }",
+    "func main(): void { var a: []int print 1 }",
+    "func main(): void { var a: [3]int var b: [3]int a = b }",
+    "func main(): void { var a: [3]int a[true] = 1 }",
+    "func main(): void { var a: [0]int }",
+    "func f(): void { var x: int x = true } func main(): void { print y }",
+    "func main(): void { print 1 + true print y }",
+    "func f(): int { return true } func main(): void { var z: int var z: int }",
+]
+
+
+def _error(analyse, source: str) -> str:
+    tree = parse.Parser(scanner.Scanner(source)).parse()
+    try:
+        analyse(tree)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return "no error"
+
+
+def bench_errors(source: str, repeat: int) -> None:
+    # each error program, and source, through semantic.process and through
+    # the passes in turn: the two must report the same error
+    for program in _ERRORS + [source]:
+        fused = _error(semantic.process, program)
+        serial = _error(_passes, program)
+        if fused != serial:
+            sys.exit(f"fused: {fused}\nserial: {serial}\nin: {program[:200]}")
+        print(f"ok  {serial[:70]}")
+    print(f"{len(_ERRORS) + 1} programs, same error either way")
+
+
+BENCHES = {
+    "scan": bench_scan,
+    "stream": bench_stream,
+    "mapped": bench_mapped,
+    "tokens": bench_tokens,
+    "relex": bench_relex,
+    "parse": bench_parse,
+    "incremental": bench_incremental,
+    "rebuild": bench_rebuild,
+    "parallel": bench_parallel,
+    "arena": bench_arena,
+    "deep": bench_deep,
+    "semantic": bench_semantic,
+    "errors": bench_errors,
+    "arrays": bench_arrays,
+    "registers": bench_registers,
+    "spills": bench_spills,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tau compiler benchmarks")
+    parser.add_argument("bench", choices=list(BENCHES))
+    parser.add_argument("files", nargs="*", help="Tau sources (default: generated)")
+    parser.add_argument("--functions", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.files:
+        source = "\n".join(open(path).read() for path in args.files)
+    else:
+        source = generate(args.functions)
+
+    BENCHES[args.bench](source, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,32 @@
 
 from tau import asts, symbols
 
+import dispatch
+import walker
+
+
+class Context:
+    # env maps each name to the stack of its visible declarations, innermost
+    # last, so resolving a use is a single dict probe. A symbol's address is
+    # (depth, slot): depth 0 is the program, 1 a function's parameters and
+    # 2 and up the blocks that declare something, slot its declaration order
+    # there. Blocks without declarations share their parent's scope
+    scope: symbols.Scope
+    env: dict[str, list[symbols.Symbol]]
+    depth: int
+    # names declared in scope so far, one entry per declaration
+    declared: list[str]
+
+    def __init__(self, scope: symbols.Scope) -> None:
+        self.scope = scope
+        self.env = {}
+        self.depth = 0
+        self.declared = []
+
+
+# what entering a scope saves of the one around it
+_Outer = tuple[symbols.Scope, list[str]]
+
 
 def process(ast: asts.Program) -> None:
     _Program(ast)
@@ -10,227 +36,269 @@ def process(ast: asts.Program) -> None:
 
 def _Program(ast: asts.Program) -> None:
     # ast.span : Span <--- set this
-    temp = symbols.GlobalScope(ast.span)
+    ctx = Context(symbols.GlobalScope(ast.span))
     for decl in ast.decls:
-        temp.symtab[decl.id.token.value] = symbols.Symbol(decl.id.token.value, temp)
-        _FuncDecl(decl, temp)
+        _FuncDecl(decl, ctx)
 
 
-def _Argument(ast: asts.Argument, scope: symbols.Scope) -> None:
+def _Argument(ast: asts.Argument, ctx: Context) -> None:
     # ast.span : Span
-    _Expr(ast.expr, scope)
+    _Expr(ast.expr, ctx)
 
 
-def _Id(ast: asts.Id, scope: symbols.Scope) -> None:
+def _Id(ast: asts.Id, ctx: Context) -> None:
     # ast.span : Span
     # ast.token : Token
     # ast.symbol : Symbol <--- set this!!
-    if isinstance(scope, symbols.LocalScope) and ast.token.value in scope.symtab:
+    ast.symbol = declare(ast.token.value, ctx)
+
+
+def declare(name: str, ctx: Context) -> symbols.Symbol:
+    # a new symbol for name in the current scope, visible from here on
+    stack = ctx.env.get(name)
+    if stack is None:
+        stack = ctx.env[name] = []
+    elif ctx.depth >= 2 and stack and stack[-1].address[0] == ctx.depth:
+        # only blocks reject duplicates; a later function or parameter of
+        # the same name replaces the earlier one
         raise Exception(f"duplicate identifier")
-    ast.symbol = symbols.Symbol(ast.token.value, scope)
-    scope.symtab[ast.token.value] = ast.symbol
+    symbol = symbols.Symbol(name, ctx.scope)
+    symbol.address = (ctx.depth, len(ctx.declared))
+    ctx.scope.symtab[name] = symbol
+    ctx.declared.append(name)
+    stack.append(symbol)
+    return symbol
+
+
+def _Decl(ast: asts.Decl, ctx: Context) -> None:
+    _DECL[type(ast)](ast, ctx)
+
+
+def _enter(ctx: Context, scope: symbols.Scope) -> _Outer:
+    outer = ctx.scope, ctx.declared
+    ctx.scope = scope
+    ctx.depth += 1
+    ctx.declared = []
+    return outer
+
+
+def _leave(ctx: Context, outer: _Outer) -> None:
+    env = ctx.env
+    for name in ctx.declared:
+        env[name].pop()
+    ctx.scope, ctx.declared = outer
+    ctx.depth -= 1
+
+
+def _enter_function(ast: asts.FuncDecl, ctx: Context) -> _Outer:
+    _Id(ast.id, ctx)
+    return open_function(ast, ctx)
 
 
-def _Decl(ast: asts.Decl, scope: symbols.Scope) -> None:
-    match ast:
-        case asts.FuncDecl():
-            _FuncDecl(ast, scope)
-        case asts.ParamDecl():
-            _ParamDecl(ast, scope)
-        case asts.VarDecl():
-            _VarDecl(ast, scope)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
+def open_function(ast: asts.FuncDecl, ctx: Context) -> _Outer:
+    # enters the function's own scope, once its name is declared
+    ast.func_scope = symbols.FuncScope(span=ast.span, parent=ctx.scope)
+    return _enter(ctx, ast.func_scope)
 
 
-def _FuncDecl(ast: asts.FuncDecl, scope: symbols.Scope) -> None:
+def _enter_block(ast: asts.CompoundStmt, ctx: Context) -> _Outer | None:
+    # None when the block declares nothing and so shares its parent's scope
+    if not ast.decls:
+        ast.local_scope = ctx.scope
+        return None
+    ast.local_scope = symbols.LocalScope(span=ast.span, parent=ctx.scope)
+    return _enter(ctx, ast.local_scope)
+
+
+def _FuncDecl(ast: asts.FuncDecl, ctx: Context) -> None:
     # ast.span : Span
     # ast.func_scope : Scope <--- set this!!
-    _Id(ast.id, scope)
-    ast.func_scope = symbols.FuncScope(span=ast.span, parent=scope)
+    outer = _enter_function(ast, ctx)
     for param in ast.params:
-        _ParamDecl(param, ast.func_scope)
-    _TypeAST(ast.ret_type_ast, ast.func_scope)
-    _CompoundStmt(ast.body, ast.func_scope)
+        _ParamDecl(param, ctx)
+    _TypeAST(ast.ret_type_ast, ctx)
+    _CompoundStmt(ast.body, ctx)
+    _leave(ctx, outer)
 
 
-def _ParamDecl(ast: asts.ParamDecl, scope: symbols.Scope) -> None:
+def _ParamDecl(ast: asts.ParamDecl, ctx: Context) -> None:
     # ast.span : Span
-    _Id(ast.id, scope)
-    _TypeAST(ast.type_ast, scope)
+    _Id(ast.id, ctx)
+    _TypeAST(ast.type_ast, ctx)
 
 
-def _VarDecl(ast: asts.VarDecl, scope: symbols.Scope) -> None:
+def _VarDecl(ast: asts.VarDecl, ctx: Context) -> None:
     # ast.span : Span
-    _Id(ast.id, scope)
-    _TypeAST(ast.type_ast, scope)
+    _Id(ast.id, ctx)
+    _TypeAST(ast.type_ast, ctx)
 
 
-def _Expr(ast: asts.Expr, scope: symbols.Scope) -> None:
-    match ast:
-        case asts.ArrayCell():
-            _ArrayCell(ast, scope)
-        case asts.BinaryOp():
-            _BinaryOp(ast, scope)
-        case asts.BoolLiteral():
-            _BoolLiteral(ast, scope)
-        case asts.CallExpr():
-            _CallExpr(ast, scope)
-        case asts.IdExpr():
-            _IdExpr(ast, scope)
-        case asts.IntLiteral():
-            _IntLiteral(ast, scope)
-        case asts.UnaryOp():
-            _UnaryOp(ast, scope)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
+def _Expr(ast: asts.Expr, ctx: Context) -> None:
+    _EXPR[type(ast)](ast, ctx)
 
 
-def _ArrayCell(ast: asts.ArrayCell, scope: symbols.Scope) -> None:
+def _ArrayCell(ast: asts.ArrayCell, ctx: Context) -> None:
     # ast.span : Span
-    _Expr(ast.arr, scope)
-    _Expr(ast.idx, scope)
+    _Expr(ast.arr, ctx)
+    _Expr(ast.idx, ctx)
 
 
-def _BinaryOp(ast: asts.BinaryOp, scope: symbols.Scope) -> None:
+def _BinaryOp(ast: asts.BinaryOp, ctx: Context) -> None:
     # ast.span : Span
     # ast.op : Token
-    _Expr(ast.left, scope)
-    _Expr(ast.right, scope)
+    _Expr(ast.left, ctx)
+    _Expr(ast.right, ctx)
 
 
-def _BoolLiteral(ast: asts.BoolLiteral, scope: symbols.Scope) -> None:
+def _BoolLiteral(ast: asts.BoolLiteral, ctx: Context) -> None:
     # ast.span : Span
     # ast.token : Token
     # ast.value : bool
     pass
 
 
-def _CallExpr(ast: asts.CallExpr, scope: symbols.Scope) -> None:
+def _CallExpr(ast: asts.CallExpr, ctx: Context) -> None:
     # ast.span : Span
-    _Expr(ast.fn, scope)
+    _Expr(ast.fn, ctx)
     for arg in ast.args:
-        _Argument(arg, scope)
+        _Argument(arg, ctx)
 
 
-def _IdExpr(ast: asts.IdExpr, scope: symbols.Scope) -> None:
+def _IdExpr(ast: asts.IdExpr, ctx: Context) -> None:
     # ast.span : Span <--- set this!!
-    if scope.lookup(ast.id.token.value) is None:
+    stack = ctx.env.get(ast.id.token.value)
+    if not stack:
         raise NameError(f"undefined symbol {ast.span}")
-    else:
-        ast.id.symbol = scope.lookup(ast.id.token.value)
+    ast.id.symbol = stack[-1]
 
 
-def _IntLiteral(ast: asts.IntLiteral, scope: symbols.Scope) -> None:
+def _IntLiteral(ast: asts.IntLiteral, ctx: Context) -> None:
     # ast.span : Span
     # ast.token : Token
     pass
 
 
-def _UnaryOp(ast: asts.UnaryOp, scope: symbols.Scope) -> None:
+def _UnaryOp(ast: asts.UnaryOp, ctx: Context) -> None:
     # ast.span : Span
     # ast.op : Token
-    _Expr(ast.expr, scope)
+    _Expr(ast.expr, ctx)
 
 
-def _Stmt(ast: asts.Stmt, scope: symbols.Scope) -> None:
-    match ast:
-        case asts.AssignStmt():
-            _AssignStmt(ast, scope)
-        case asts.CallStmt():
-            _CallStmt(ast, scope)
-        case asts.CompoundStmt():
-            _CompoundStmt(ast, scope)
-        case asts.IfStmt():
-            _IfStmt(ast, scope)
-        case asts.PrintStmt():
-            _PrintStmt(ast, scope)
-        case asts.ReturnStmt():
-            _ReturnStmt(ast, scope)
-        case asts.WhileStmt():
-            _WhileStmt(ast, scope)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
+def _Stmt(ast: asts.Stmt, ctx: Context) -> None:
+    _STMT[type(ast)](ast, ctx)
 
 
-def _AssignStmt(ast: asts.AssignStmt, scope: symbols.Scope) -> None:
+def _AssignStmt(ast: asts.AssignStmt, ctx: Context) -> None:
     # ast.span : Span
-    _Expr(ast.lhs, scope)
-    _Expr(ast.rhs, scope)
+    _Expr(ast.lhs, ctx)
+    _Expr(ast.rhs, ctx)
 
 
-def _CallStmt(ast: asts.CallStmt, scope: symbols.Scope) -> None:
+def _CallStmt(ast: asts.CallStmt, ctx: Context) -> None:
     # ast.span : Span
-    _CallExpr(ast.call, scope)
+    _CallExpr(ast.call, ctx)
 
 
-def _CompoundStmt(ast: asts.CompoundStmt, scope: symbols.Scope) -> None:
+def _CompoundStmt(ast: asts.CompoundStmt, ctx: Context) -> None:
     # ast.span : Span
     # ast.local_scope : Scope <--- set this!!
-    ast.local_scope = symbols.LocalScope(span=ast.span, parent=scope)
+    outer = _enter_block(ast, ctx)
     for decl in ast.decls:
-        _VarDecl(decl, ast.local_scope)
+        _VarDecl(decl, ctx)
     for stmt in ast.stmts:
-        _Stmt(stmt, ast.local_scope)
+        _Stmt(stmt, ctx)
+    if outer is not None:
+        _leave(ctx, outer)
 
 
-def _IfStmt(ast: asts.IfStmt, scope: symbols.Scope) -> None:
+def _IfStmt(ast: asts.IfStmt, ctx: Context) -> None:
     # ast.span : Span
-    _Expr(ast.expr, scope)
-    _CompoundStmt(ast.thenStmt, scope)
+    _Expr(ast.expr, ctx)
+    _CompoundStmt(ast.thenStmt, ctx)
     if ast.elseStmt:
-        _CompoundStmt(ast.elseStmt, scope)
+        _CompoundStmt(ast.elseStmt, ctx)
 
 
-def _PrintStmt(ast: asts.PrintStmt, scope: symbols.Scope) -> None:
+def _PrintStmt(ast: asts.PrintStmt, ctx: Context) -> None:
     # ast.span : Span
-    _Expr(ast.expr, scope)
+    _Expr(ast.expr, ctx)
 
 
-def _ReturnStmt(ast: asts.ReturnStmt, scope: symbols.Scope) -> None:
+def _ReturnStmt(ast: asts.ReturnStmt, ctx: Context) -> None:
     # ast.span : Span
     if ast.expr:
-        _Expr(ast.expr, scope)
+        _Expr(ast.expr, ctx)
 
 
-def _WhileStmt(ast: asts.WhileStmt, scope: symbols.Scope) -> None:
+def _WhileStmt(ast: asts.WhileStmt, ctx: Context) -> None:
     # ast.span : Span
-    _Expr(ast.expr, scope)
-    _CompoundStmt(ast.stmt, scope)
+    _Expr(ast.expr, ctx)
+    _CompoundStmt(ast.stmt, ctx)
 
 
-def _TypeAST(ast: asts.TypeAST, scope: symbols.Scope) -> None:
-    match ast:
-        case asts.ArrayType():
-            _ArrayType(ast, scope)
-        case asts.BoolType():
-            _BoolType(ast, scope)
-        case asts.IntType():
-            _IntType(ast, scope)
-        case asts.VoidType():
-            _VoidType(ast, scope)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
+def _TypeAST(ast: asts.TypeAST, ctx: Context) -> None:
+    _TYPE_AST[type(ast)](ast, ctx)
 
 
-def _ArrayType(ast: asts.ArrayType, scope: symbols.Scope) -> None:
+def _ArrayType(ast: asts.ArrayType, ctx: Context) -> None:
     # ast.span : Span
-    _TypeAST(ast.element_type_ast, scope)
+    _TypeAST(ast.element_type_ast, ctx)
 
 
-def _BoolType(ast: asts.BoolType, scope: symbols.Scope) -> None:
+def _BoolType(ast: asts.BoolType, ctx: Context) -> None:
     # ast.span : Span
     # ast.token : Token
     pass
 
 
-def _IntType(ast: asts.IntType, scope: symbols.Scope) -> None:
+def _IntType(ast: asts.IntType, ctx: Context) -> None:
     # ast.span : Span
     # ast.token : Token
     pass
 
 
-def _VoidType(ast: asts.VoidType, scope: symbols.Scope) -> None:
+def _VoidType(ast: asts.VoidType, ctx: Context) -> None:
     # ast.span : Span
     # ast.token : Token
     pass
+
+
+_DECL = dispatch.Dispatch(asts.Decl, globals())
+_EXPR = dispatch.Dispatch(asts.Expr, globals())
+_STMT = dispatch.Dispatch(asts.Stmt, globals())
+_TYPE_AST = dispatch.Dispatch(asts.TypeAST, globals())
+
+
+class Visitor(walker.Visitor):
+    # the same pass as hooks for a walker.Walker
+    ctx: Context
+    outer: list[_Outer | None]
+
+    def __init__(self) -> None:
+        self.outer = []
+
+    def enter_Program(self, ast: asts.Program, parent: None) -> None:
+        self.ctx = Context(symbols.GlobalScope(ast.span))
+
+    def enter_FuncDecl(self, ast: asts.FuncDecl, parent: asts.AST) -> None:
+        self.outer.append(_enter_function(ast, self.ctx))
+
+    def exit_FuncDecl(self, ast: asts.FuncDecl, parent: asts.AST) -> None:
+        _leave(self.ctx, self.outer.pop())
+
+    def enter_ParamDecl(self, ast: asts.ParamDecl, parent: asts.AST) -> None:
+        _Id(ast.id, self.ctx)
+
+    def enter_VarDecl(self, ast: asts.VarDecl, parent: asts.AST) -> None:
+        _Id(ast.id, self.ctx)
+
+    def enter_CompoundStmt(self, ast: asts.CompoundStmt, parent: asts.AST) -> None:
+        self.outer.append(_enter_block(ast, self.ctx))
+
+    def exit_CompoundStmt(self, ast: asts.CompoundStmt, parent: asts.AST) -> None:
+        outer = self.outer.pop()
+        if outer is not None:
+            _leave(self.ctx, outer)
+
+    def enter_IdExpr(self, ast: asts.IdExpr, parent: asts.AST) -> None:
+        _IdExpr(ast, self.ctx)
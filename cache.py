@@ -0,0 +1,124 @@
+import hashlib
+import os
+import tempfile
+import zlib
+
+from tau import asts, tokens
+
+import parse
+import serialize
+from scanner import Scanner
+
+
+def _version() -> str:
+    # the front end's own source and that of the node and token classes a
+    # tree is rebuilt from; any change to them invalidates the cache
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    names = ("scanner.py", "parse.py", "serialize.py")
+    paths = [os.path.join(here, name) for name in names]
+    paths += asts.__file__, tokens.__file__
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+VERSION = _version()
+
+
+class ASTCache:
+    # a directory of parsed programs, one file per (VERSION, source) hash
+    # holding the zlib-compressed serialize.dumps of its Program. A file's
+    # mtime is its last use: hits touch it, and once the files take more than
+    # max_bytes the least recently used ones are deleted
+    def __init__(self, directory: str, max_bytes: int = 256 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._sizes = {
+            entry.path: entry.stat().st_size
+            for entry in os.scandir(directory)
+            if entry.name.endswith(".ast")
+        }
+
+    def path(self, source: str) -> str:
+        digest = hashlib.sha256(VERSION.encode())
+        digest.update(source.encode())
+        return os.path.join(self.directory, digest.hexdigest() + ".ast")
+
+    def get(self, source: str) -> asts.Program | None:
+        path = self.path(source)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            # missing, or evicted underneath us
+            self.misses += 1
+            return None
+        try:
+            tree = serialize.loads(zlib.decompress(data))
+        except Exception:
+            # corrupted, or written by a layout decode no longer reads:
+            # anything from a bad tag to a node class's changed fields
+            tree = None
+        if not isinstance(tree, asts.Program):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            # evicted by another process since the read; the tree is whole
+            pass
+        self.hits += 1
+        return tree
+
+    def put(self, source: str, tree: asts.Program) -> None:
+        path = self.path(source)
+        data = zlib.compress(serialize.dumps(tree))
+        # written under a temporary name first, so a concurrent get() never
+        # sees half a file
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp, path)
+        self._sizes[path] = len(data)
+        self._evict()
+
+    def _evict(self) -> None:
+        total = sum(self._sizes.values())
+        if total <= self.max_bytes:
+            return
+        by_age = []
+        for path in self._sizes:
+            try:
+                by_age.append((os.stat(path).st_mtime, path))
+            except OSError:
+                by_age.append((0.0, path))
+        for _, path in sorted(by_age):
+            if total <= self.max_bytes:
+                break
+            total -= self._sizes.pop(path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.evictions += 1
+
+    def parse(self, source: str) -> asts.Program:
+        # scan + parse, skipped entirely on a hit
+        tree = self.get(source)
+        if tree is None:
+            tree = parse.Parser(Scanner(source)).parse()
+            self.put(source, tree)
+        return tree
+
+    def stats(self) -> str:
+        size = sum(self._sizes.values())
+        return (
+            f"{self.hits} hits, {self.misses} misses, {self.evictions} evicted, "
+            f"{len(self._sizes)} files, {size / 2**20:.1f} MiB"
+        )
@@ -0,0 +1,143 @@
+from tau import asts, symbols
+
+import walker
+
+
+class Function:
+    # what the program knows about one function once the semantic passes
+    # have run: its signature, frame size, the functions it refers to and
+    # the calls made to it
+    decl: asts.FuncDecl
+    signature: symbols.FuncType
+    calls: list[str]
+    call_sites: list[asts.CallExpr]
+
+    def __init__(self, decl: asts.FuncDecl) -> None:
+        self.decl = decl
+        self.signature = decl.semantic_type
+        self.calls = []
+        self.call_sites = []
+
+    @property
+    def name(self) -> str:
+        return self.decl.id.token.value
+
+    @property
+    def params(self) -> list[symbols.SemanticType]:
+        return self.signature.params
+
+    @property
+    def size(self) -> int:
+        return self.decl.size
+
+
+class CallGraph:
+    # the program's functions by name, in declaration order, and who calls
+    # whom. An edge is any use of a function's name, called or not, so
+    # reachability never drops a function that is used as a value
+    functions: dict[str, Function]
+
+    def __init__(self, ast: asts.Program) -> None:
+        self.functions = {}
+        for decl in ast.decls:
+            function = self.functions[decl.id.token.value] = Function(decl)
+            for name, sites in calls(decl).items():
+                function.calls.append(name)
+                self.functions[name].call_sites.extend(sites)
+
+    def __getitem__(self, name: str) -> Function:
+        return self.functions[name]
+
+    def sccs(self) -> list[list[str]]:
+        # strongly connected components, Tarjan's algorithm with an explicit
+        # stack; a component comes after every component it calls into
+        index: dict[str, int] = {}
+        low: dict[str, int] = {}
+        stack: list[str] = []
+        on_stack: set[str] = set()
+        out: list[list[str]] = []
+        for root in self.functions:
+            if root in index:
+                continue
+            work = [(root, 0)]
+            while work:
+                name, i = work.pop()
+                if i == 0:
+                    index[name] = low[name] = len(index)
+                    stack.append(name)
+                    on_stack.add(name)
+                calls = self.functions[name].calls
+                while i < len(calls):
+                    callee = calls[i]
+                    i += 1
+                    if callee not in index:
+                        work.append((name, i))
+                        work.append((callee, 0))
+                        break
+                    if callee in on_stack:
+                        low[name] = min(low[name], index[callee])
+                else:
+                    if low[name] == index[name]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == name:
+                                break
+                        out.append(component)
+                    if work:
+                        caller = work[-1][0]
+                        low[caller] = min(low[caller], low[name])
+        return out
+
+    def recursive(self) -> set[str]:
+        # functions that can end up calling themselves
+        out = set()
+        for component in self.sccs():
+            name = component[0]
+            if len(component) > 1 or name in self.functions[name].calls:
+                out.update(component)
+        return out
+
+    def reachable(self, root: str = "main") -> set[str]:
+        return reachable({f.name: f.calls for f in self.functions.values()}, root)
+
+
+def calls(decl: asts.FuncDecl) -> dict[str, list[asts.CallExpr]]:
+    # the functions an analysed function uses, first use first, each with
+    # the calls to it made there. Functions are the only symbols declared
+    # at depth 0, see bindings.Context
+    found: dict[str, list[asts.CallExpr]] = {}
+    stack: list[asts.AST] = [decl.body]
+    while stack:
+        node = stack.pop()
+        cls = type(node)
+        if cls is asts.IdExpr:
+            if node.id.symbol.address[0] == 0:
+                found.setdefault(node.id.token.value, [])
+        elif cls is asts.CallExpr and type(node.fn) is asts.IdExpr:
+            if node.fn.id.symbol.address[0] == 0:
+                found.setdefault(node.fn.id.token.value, []).append(node)
+        children: list[asts.AST] = []
+        for name in walker.CHILDREN[cls]:
+            child = getattr(node, name)
+            if type(child) is list:
+                children.extend(child)
+            elif child is not None:
+                children.append(child)
+        stack.extend(reversed(children))
+    return found
+
+
+def reachable(calls: dict[str, list[str]], root: str = "main") -> set[str]:
+    # the functions root calls, directly or not, and root itself; calls maps
+    # each function to the functions it calls
+    seen = {root} if root in calls else set()
+    work = list(seen)
+    while work:
+        for callee in calls[work.pop()]:
+            if callee not in seen:
+                seen.add(callee)
+                work.append(callee)
+    return seen
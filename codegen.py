@@ -1,69 +1,114 @@
 # pyright: reportUnboundVariable=none, reportUnusedFunction=none
 # REMEMBER TO REMOVE THE pyright DIRECTIVE ABOVE!!!!!!
 
-from tau import asts
+import itertools
+from typing import Iterable
+
+from tau import asts, symbols
 from vm.vm_insns import *
 
+import callgraph
+import dispatch
+import regalloc
+
 
-def process(ast: asts.Program) -> list[Insn]:
-    return _Program(ast)
+def process(ast: asts.Program, registers: int | None = None) -> list[Insn]:
+    # registers bounds the register file, see regalloc; None leaves as many
+    # as assign numbered
+    return _Program(ast, registers)
 
 
-def _Program(ast: asts.Program) -> list[Insn]:
+def _Program(ast: asts.Program, registers: int | None = None) -> list[Insn]:
     # ast.register_pool : list[str]
     # throw error if main exist or not
     if not any(decl.id.token.value == "main" for decl in ast.decls):
         raise NameError("main not found", ast.span)
+    # functions main never reaches, directly or not, are left out
+    live = callgraph.CallGraph(ast).reachable("main")
+    return link(
+        _FuncDecl(decl, registers)
+        for decl in ast.decls
+        if decl.id.token.value in live
+    )
+
+
+def function(ast: asts.FuncDecl, registers: int | None = None) -> list[Insn]:
+    # the code of one analysed function. It depends on nothing else in the
+    # program, bar the names of the functions it calls, so it can be kept
+    # and put together with other functions' code by link()
+    return _FuncDecl(ast, registers)
+
+
+def link(functions: Iterable[list[Insn]]) -> list[Insn]:
+    # a program from the code of its functions, main among them
     retval: list[Insn] = [
         Call(label="main"),
         Halt(),
     ]
-    for decl in ast.decls:
-        retval.extend(_FuncDecl(decl))
+    for insns in functions:
+        retval.extend(insns)
     return retval
 
 
+class _Function:
+    # the function whose code is being generated. Its labels are
+    # "<KIND>_<function>_<n>", n counting from 0 in each function: function
+    # names are unique, so a function's labels are the same whichever
+    # program it is compiled in, and never clash. Registers saved around a
+    # call go in slots past the locals, "r<n>" at offset size + n - 1
+    def __init__(self, ast: asts.FuncDecl) -> None:
+        self.name = ast.id.token.value
+        self.labels = itertools.count()
+        self.size = ast.size
+        self.saved = 0
+
+    def slot(self, register: str) -> int:
+        n = int(register[1:])
+        self.saved = max(self.saved, n)
+        return self.size + n - 1
+
+
+_function: _Function
+
+
+def _unique() -> str:
+    return f"{_function.name}_{next(_function.labels)}"
+
+
 def _Decl(ast: asts.Decl) -> list[Insn]:
-    retval: list[Insn]
-    match ast:
-        case asts.FuncDecl():
-            retval = _FuncDecl(ast)
-        case asts.ParamDecl():
-            retval = _ParamDecl(ast)
-        case asts.VarDecl():
-            retval = _VarDecl(ast)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
-    return retval
+    return _DECL[type(ast)](ast)
 
 
-def _FuncDecl(ast: asts.FuncDecl) -> list[Insn]:
+def _FuncDecl(ast: asts.FuncDecl, registers: int | None = None) -> list[Insn]:
     # ast.semantic_type : SemanticType
     # ast.id : Id
     # ast.ret_type_ast : TypeAST
     # ast.size : int
     # ast.register_pool : list[str]
+    global _function
+    _function = _Function(ast)
+    # the body first: the frame grows by the slots it saves registers in,
+    # and by those regalloc spills to
+    body: list[Insn] = []
+    for param in ast.params:
+        body.extend(_ParamDecl(param))
+    body.extend(_CompoundStmt(ast.body))
+    size = ast.size + _function.saved
+    # assign's numbering is an allocation already when it fits
+    if registers is not None and len(ast.register_pool) > registers:
+        body, spilled = regalloc.allocate(body, registers, size)
+        size += spilled
     retval: list[Insn] = []
     retval.append(
         Label(ast.id.token.value)
     )
     retval.append(Move("FP1", "SP"))
-    retval.append(AddImmediate("SP1", "FP1", ast.size))
+    retval.append(AddImmediate("SP1", "FP1", size))
     retval.extend(pro())
     retval.append(Move("FP", "FP1"))
     retval.append(Move("SP", "SP1"))
     retval.append(AddImmediate("SP", "SP", 1))
-    # register pool on the stack
-    # for reg in ast.register_pool:
-    #     retval.append(Store("SP", reg))
-    #     retval.append(AddImmediate("SP", "SP", 1))
-    for param in ast.params:
-        retval.extend(_ParamDecl(param))
-    # loop through the register pool
-    # for i in range(len(ast.register_pool) - 1, -1, -1):
-    #     retval.append(Load("SP", ast.register_pool[i]))
-    #     retval.append(AddImmediate("SP", "SP", -1))
-    retval.extend(_CompoundStmt(ast.body))
+    retval.extend(body)
     retval.append(Label("EPILOGUE_" + ast.id.token.value))
     retval.extend(epi())
     return retval
@@ -108,33 +153,21 @@ def _VarDecl(ast: asts.VarDecl) -> list[Insn]:
 
 
 def _Stmt(ast: asts.Stmt) -> list[Insn]:
-    retval: list[Insn]
-    match ast:
-        case asts.AssignStmt():
-            retval = _AssignStmt(ast)
-        case asts.CallStmt():
-            retval = _CallStmt(ast)
-        case asts.CompoundStmt():
-            retval = _CompoundStmt(ast)
-        case asts.IfStmt():
-            retval = _IfStmt(ast)
-        case asts.PrintStmt():
-            retval = _PrintStmt(ast)
-        case asts.ReturnStmt():
-            retval = _ReturnStmt(ast)
-        case asts.WhileStmt():
-            retval = _WhileStmt(ast)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
-    return retval
+    return _STMT[type(ast)](ast)
 
 
 def _AssignStmt(ast: asts.AssignStmt) -> list[Insn]:
     # ast.lhs : Expr
     # ast.rhs : Expr
     retval: list[Insn] = []
-    retval.extend(_rval_Expr(ast.rhs))
-    retval.extend(_lval_Expr(ast.lhs))
+    if type(ast.lhs) is asts.ArrayCell:
+        # the cell's address first: its index may need the registers the
+        # value is computed in
+        retval.extend(_lval_Expr(ast.lhs))
+        retval.extend(_rval_Expr(ast.rhs))
+    else:
+        retval.extend(_rval_Expr(ast.rhs))
+        retval.extend(_lval_Expr(ast.lhs))
     retval.append(Store(ast.lhs.register, ast.rhs.register))
     return retval
 
@@ -159,13 +192,14 @@ def _CompoundStmt(ast: asts.CompoundStmt) -> list[Insn]:
 def _IfStmt(ast: asts.IfStmt) -> list[Insn]:
     # ast.expr : Expr
     retval: list[Insn] = []
-    retval.extend(flow(ast.expr, "ELSE_" + str(id(ast)), False))
+    n = _unique()
+    retval.extend(flow(ast.expr, "ELSE_" + n, False))
     retval.extend(_CompoundStmt(ast.thenStmt))
-    retval.append(Jump("BOTTOM_" + str(id(ast))))
-    retval.append(Label("ELSE_" + str(id(ast))))
+    retval.append(Jump("BOTTOM_" + n))
+    retval.append(Label("ELSE_" + n))
     if ast.elseStmt:
         retval.extend(_CompoundStmt(ast.elseStmt))
-    retval.append(Label("BOTTOM_" + str(id(ast))))
+    retval.append(Label("BOTTOM_" + n))
     return retval
 
 
@@ -193,42 +227,25 @@ def _ReturnStmt(ast: asts.ReturnStmt) -> list[Insn]:
 def _WhileStmt(ast: asts.WhileStmt) -> list[Insn]:
     # ast.expr : Expr
     retval: list[Insn] = []
-    retval.append(Label("START_LOOP_" + str(id(ast))))
-    retval.extend(flow(ast.expr, "EXIT_LOOP_" + str(id(ast)), False))
+    n = _unique()
+    retval.append(Label("START_LOOP_" + n))
+    retval.extend(flow(ast.expr, "EXIT_LOOP_" + n, False))
     retval.extend(_CompoundStmt(ast.stmt))
-    retval.append(Jump("START_LOOP_" + str(id(ast))))
-    retval.append(Label("EXIT_LOOP_" + str(id(ast))))
+    retval.append(Jump("START_LOOP_" + n))
+    retval.append(Label("EXIT_LOOP_" + n))
     return retval
 
 
 def _rval_Expr(ast: asts.Expr) -> list[Insn]:
-    retval: list[Insn]
-    match ast:
-        case asts.ArrayCell():
-            retval = _rval_ArrayCell(ast)
-        case asts.BinaryOp():
-            retval = _rval_BinaryOp(ast)
-        case asts.BoolLiteral():
-            retval = _rval_BoolLiteral(ast)
-        case asts.CallExpr():
-            retval = _rval_CallExpr(ast)
-        case asts.IdExpr():
-            retval = _rval_IdExpr(ast)
-        case asts.IntLiteral():
-            retval = _rval_IntLiteral(ast)
-        case asts.UnaryOp():
-            retval = _rval_UnaryOp(ast)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
-    return retval
+    return _RVAL[type(ast)](ast)
 
 
 def _rval_ArrayCell(ast: asts.ArrayCell) -> list[Insn]:
     # ast.semantic_type : SemanticType
     # ast.register : str
-    retval: list[Insn]
-    _rval_Expr(ast.arr)
-    _rval_Expr(ast.idx)
+    retval: list[Insn] = []
+    retval.extend(_lval_ArrayCell(ast))
+    retval.append(Load(ast.register, ast.register))
     return retval
 
 
@@ -238,29 +255,35 @@ def _rval_BinaryOp(ast: asts.BinaryOp) -> list[Insn]:
     # ast.op : Token
     retval: list[Insn] = []
     if ast.op.value == "or":
+        n = _unique()
         retval.extend(_rval_Expr(ast.left))
-        retval.append(JumpIfNotZero(ast.left.register, "OR_TRUE_" + str(id(ast))))
+        retval.append(JumpIfNotZero(ast.left.register, "OR_TRUE_" + n))
         retval.extend(_rval_Expr(ast.right))
-        retval.append(JumpIfNotZero(ast.right.register, "OR_TRUE_" + str(id(ast))))
+        retval.append(JumpIfNotZero(ast.right.register, "OR_TRUE_" + n))
         retval.append(Immediate(ast.register, 0))
-        retval.append(Jump("OR_EXIT_" + str(id(ast))))
-        retval.append(Label("OR_TRUE_" + str(id(ast))))
+        retval.append(Jump("OR_EXIT_" + n))
+        retval.append(Label("OR_TRUE_" + n))
         retval.append(Immediate(ast.register, 1))
-        retval.append(Label("OR_EXIT_" + str(id(ast))))
+        retval.append(Label("OR_EXIT_" + n))
         return retval
     elif ast.op.value == "and":
+        n = _unique()
         retval.extend(_rval_Expr(ast.left))
-        retval.append(JumpIfZero(ast.left.register, "AND_FALSE_" + str(id(ast))))
+        retval.append(JumpIfZero(ast.left.register, "AND_FALSE_" + n))
         retval.extend(_rval_Expr(ast.right))
-        retval.append(JumpIfZero(ast.right.register, "AND_FALSE_" + str(id(ast))))
+        retval.append(JumpIfZero(ast.right.register, "AND_FALSE_" + n))
         retval.append(Immediate(ast.register, 1))
-        retval.append(Jump("AND_EXIT_" + str(id(ast))))
-        retval.append(Label("AND_FALSE_" + str(id(ast))))
+        retval.append(Jump("AND_EXIT_" + n))
+        retval.append(Label("AND_FALSE_" + n))
         retval.append(Immediate(ast.register, 0))
-        retval.append(Label("AND_EXIT_" + str(id(ast))))
+        retval.append(Label("AND_EXIT_" + n))
         return retval
-    retval.extend(_rval_Expr(ast.left))
-    retval.extend(_rval_Expr(ast.right))
+    # in the order assign numbered them, see assign._operands
+    first, second = ast.left, ast.right
+    if ast.right_first:
+        first, second = second, first
+    retval.extend(_rval_Expr(first))
+    retval.extend(_rval_Expr(second))
     match ast.op.value:
         case "+":
             retval.append(Add(ast.register, ast.left.register, ast.right.register))
@@ -317,7 +340,15 @@ def _rval_CallExpr(ast: asts.CallExpr) -> list[Insn]:
         counter -= 1
     # this fixes mypy issue
     assert isinstance(ast.fn, asts.IdExpr)
+    # the callee may use any register, so the caller keeps the values it
+    # still needs in its frame
+    for reg in ast.live:
+        retval.append(AddImmediate("temp", "FP", _function.slot(reg)))
+        retval.append(Store("temp", reg))
     retval.append(Call(label=ast.fn.id.token.value))
+    for reg in ast.live:
+        retval.append(AddImmediate("temp", "FP", _function.slot(reg)))
+        retval.append(Load(reg, "temp"))
     retval.append(AddImmediate("SP2", "SP", -1))
     retval.append(Load(ast.register, "SP2"))
     retval.append(AddImmediate("SP", "SP", -len(ast.args) - 1))
@@ -330,10 +361,21 @@ def _rval_IdExpr(ast: asts.IdExpr) -> list[Insn]:
     # ast.id : Id
     retval: list[Insn] = []
     retval.extend(_lval_Expr(ast))
-    retval.append(Load(ast.register, ast.register))
+    if not _in_frame(ast):
+        retval.append(Load(ast.register, ast.register))
     return retval
 
 
+def _in_frame(ast: asts.IdExpr) -> bool:
+    # an array variable's value is its address, where its elements start.
+    # An array parameter (depth 1, see bindings.Context) is passed by
+    # reference: its slot holds the address of the caller's array
+    return (
+        type(ast.semantic_type) is symbols.ArrayType
+        and ast.id.symbol.address[0] > 1
+    )
+
+
 def _rval_IntLiteral(ast: asts.IntLiteral) -> list[Insn]:
     # ast.semantic_type : SemanticType
     # ast.register : str
@@ -365,33 +407,20 @@ def _rval_Argument(ast: asts.Argument) -> list[Insn]:
 
 
 def _lval_Expr(ast: asts.Expr) -> list[Insn]:
-    retval: list[Insn]
-    match ast:
-        case asts.ArrayCell():
-            retval = _lval_ArrayCell(ast)
-        case asts.BinaryOp():
-            retval = _lval_BinaryOp(ast)
-        case asts.BoolLiteral():
-            retval = _lval_BoolLiteral(ast)
-        case asts.CallExpr():
-            retval = _lval_CallExpr(ast)
-        case asts.IdExpr():
-            retval = _lval_IdExpr(ast)
-        case asts.IntLiteral():
-            retval = _lval_IntLiteral(ast)
-        case asts.UnaryOp():
-            retval = _lval_UnaryOp(ast)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
-    return retval
+    return _LVAL[type(ast)](ast)
 
 
 def _lval_ArrayCell(ast: asts.ArrayCell) -> list[Insn]:
     # ast.semantic_type : SemanticType
     # ast.register : str
-    retval: list[Insn]
-    _lval_Expr(ast.arr)
-    _lval_Expr(ast.idx)
+    # the array's address plus the index; ast.arr has ast's register
+    retval: list[Insn] = []
+    first, second = ast.arr, ast.idx
+    if ast.right_first:
+        first, second = second, first
+    retval.extend(_rval_Expr(first))
+    retval.extend(_rval_Expr(second))
+    retval.append(Add(ast.register, ast.arr.register, ast.idx.register))
     return retval
 
 
@@ -459,25 +488,7 @@ def _lval_Argument(ast: asts.Argument) -> list[Insn]:
 
 # TODO: fill out flow
 def flow(ast: asts.Expr, lab: str, condition: bool) -> list[Insn]:
-    retval: list[Insn] = []
-    match ast:
-        case asts.ArrayCell():
-            retval = _flow_ArrayCell(ast, lab, condition)
-        case asts.BinaryOp():
-            retval = _flow_BinaryOp(ast, lab, condition)
-        case asts.BoolLiteral():
-            retval = _flow_BoolLiteral(ast, lab, condition)
-        case asts.CallExpr():
-            retval = _flow_CallExpr(ast, lab, condition)
-        case asts.IdExpr():
-            retval = _flow_IdExpr(ast, lab, condition)
-        case asts.IntLiteral():
-            retval = _flow_IntLiteral(ast, lab, condition)
-        case asts.UnaryOp():
-            retval = _flow_UnaryOp(ast, lab, condition)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
-    return retval
+    return _FLOW[type(ast)](ast, lab, condition)
 
 
 def _flow_ArrayCell(ast: asts.ArrayCell, lab: str, condition: bool) -> list[Insn]:
@@ -494,9 +505,10 @@ def _flow_BinaryOp(ast: asts.BinaryOp, lab: str, condition: bool) -> list[Insn]:
     match op:
         case "and":
             if condition:
-                retval.extend(flow(ast.left, "AND_LAB_" + str(id(ast)), False))
+                n = _unique()
+                retval.extend(flow(ast.left, "AND_LAB_" + n, False))
                 retval.extend(flow(ast.right, lab, True))
-                retval.append(Label("AND_LAB_" + str(id(ast))))
+                retval.append(Label("AND_LAB_" + n))
             else:
                 retval.extend(flow(ast.left, lab, False))
                 retval.extend(flow(ast.right, lab, False))
@@ -505,9 +517,10 @@ def _flow_BinaryOp(ast: asts.BinaryOp, lab: str, condition: bool) -> list[Insn]:
                 retval.extend(flow(ast.left, lab, True))
                 retval.extend(flow(ast.right, lab, True))
             else:
-                retval.extend(flow(ast.left, "OR_LAB_" + str(id(ast)), True))
+                n = _unique()
+                retval.extend(flow(ast.left, "OR_LAB_" + n, True))
                 retval.extend(flow(ast.right, lab, False))
-                retval.append(Label("OR_LAB_" + str(id(ast))))
+                retval.append(Label("OR_LAB_" + n))
         case _:
             if condition:
                 retval.extend(_rval_Expr(ast))
@@ -555,3 +568,10 @@ def _flow_UnaryOp(ast: asts.UnaryOp, lab: str, condition: bool) -> list[Insn]:
     else:
         raise NotImplementedError(f"Unknown type {ast}")
     return retval
+
+
+_DECL = dispatch.Dispatch(asts.Decl, globals())
+_STMT = dispatch.Dispatch(asts.Stmt, globals())
+_RVAL = dispatch.Dispatch(asts.Expr, globals(), "_rval_")
+_LVAL = dispatch.Dispatch(asts.Expr, globals(), "_lval_")
+_FLOW = dispatch.Dispatch(asts.Expr, globals(), "_flow_")
@@ -0,0 +1,43 @@
+import warnings
+from typing import Any, Callable
+
+from tau import asts
+
+
+def node_types(base: type) -> list[type]:
+    # the concrete tau.asts classes deriving from base
+    return sorted(
+        (
+            cls
+            for cls in vars(asts).values()
+            if isinstance(cls, type) and issubclass(cls, base) and cls is not base
+        ),
+        key=lambda cls: cls.__name__,
+    )
+
+
+class Dispatch(dict[type, Callable[..., Any]]):
+    # type(node) -> handler for the node types deriving from base, built
+    # once per pass from the functions named prefix + class name in its
+    # module, so a call is one dict probe rather than a match over every
+    # case before the right one. Node types without a handler are warned
+    # about when the table is built, and raise NotImplementedError, as the
+    # match's default case did, when one turns up
+    def __init__(self, base: type, namespace: dict[str, Any], prefix: str = "_"):
+        super().__init__()
+        missing = []
+        for cls in node_types(base):
+            handler = namespace.get(prefix + cls.__name__)
+            if handler is None:
+                missing.append(cls.__name__)
+            else:
+                self[cls] = handler
+        if missing:
+            module = namespace.get("__name__", "?")
+            warnings.warn(
+                f"{module}: no {prefix}* handler for {', '.join(missing)}",
+                stacklevel=2,
+            )
+
+    def __missing__(self, cls: type) -> Callable[..., Any]:
+        raise NotImplementedError(f"Unknown type {cls.__name__}")
@@ -0,0 +1,203 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, Iterator
+
+from vm.vm_insns import Insn
+
+import codegen
+import parse
+import scanner
+import semantic
+from cache import ASTCache
+from names import NameTable
+
+
+PHASES = ("scan", "parse", "semantic", "codegen")
+
+
+class Result:
+    path: str
+    error: str | None
+    insns: list[Insn] | None
+    count: int
+    cached: bool
+    timings: dict[str, float]
+
+    def __init__(self, path: str):
+        self.path = path
+        self.error = None
+        self.insns = None
+        self.count = 0
+        self.cached = False
+        self.timings = {}
+
+    @property
+    def total(self) -> float:
+        return sum(self.timings.values())
+
+
+def compile_source(
+    source: str,
+    timings: dict[str, float] | None = None,
+    cache: ASTCache | None = None,
+    registers: int | None = None,
+    threads: int | None = None,
+) -> list[Insn]:
+    # the whole pipeline for one program; per-phase seconds go into timings.
+    # A cache hit skips scanning, and its load time counts as parsing.
+    # registers bounds the register file, see codegen.process; threads
+    # analyses the program's functions concurrently, on a free-threaded
+    # interpreter only, see semantic.process_parallel
+    timings = timings if timings is not None else {}
+    clock = time.perf_counter
+    start = clock()
+    ast = cache.get(source) if cache is not None else None
+    if ast is None:
+        tokens = scanner.Scanner(source, names=NameTable())
+        timings["scan"] = clock() - start
+        start = clock()
+        ast = parse.Parser(tokens).parse()
+        if cache is not None:
+            cache.put(source, ast)
+    else:
+        timings["scan"] = 0.0
+    timings["parse"] = clock() - start
+    start = clock()
+    if threads:
+        semantic.process_parallel(ast, threads)
+    else:
+        semantic.process(ast)
+    timings["semantic"] = clock() - start
+    start = clock()
+    insns = codegen.process(ast, registers)
+    timings["codegen"] = clock() - start
+    return insns
+
+
+# one ASTCache per directory and process, so its file list is read once
+_caches: dict[str, ASTCache] = {}
+
+
+def compile_file(
+    path: str,
+    keep: bool = False,
+    cache: str | None = None,
+    registers: int | None = None,
+    threads: int | None = None,
+) -> Result:
+    # never raises, so one bad file cannot take down a batch
+    result = Result(path)
+    try:
+        with open(path) as f:
+            source = f.read()
+        ast_cache = None
+        if cache is not None:
+            ast_cache = _caches.get(cache)
+            if ast_cache is None:
+                ast_cache = _caches[cache] = ASTCache(cache)
+            hits = ast_cache.hits
+        insns = compile_source(
+            source, result.timings, ast_cache, registers, threads
+        )
+        result.cached = ast_cache is not None and ast_cache.hits > hits
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    else:
+        result.count = len(insns)
+        if keep:
+            result.insns = insns
+    return result
+
+
+def find_sources(paths: Iterable[str]) -> list[str]:
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, f) for f in files if f.endswith(".tau"))
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def compile_batch(
+    paths: Iterable[str],
+    workers: int | None = None,
+    keep: bool = False,
+    cache: str | None = None,
+    registers: int | None = None,
+    threads: int | None = None,
+) -> Iterator[Result]:
+    # results are yielded as files finish, not in input order; a worker
+    # that dies (e.g. BrokenProcessPool) fails its own files, not the batch
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(compile_file, path, keep, cache, registers, threads): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                result = Result(futures[future])
+                result.error = f"{type(e).__name__}: {e}"
+                yield result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile many Tau files in parallel")
+    parser.add_argument("paths", nargs="+", help=".tau files or directories")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("-q", "--quiet", action="store_true")
+    parser.add_argument("--cache", help="directory of cached parsed programs")
+    parser.add_argument(
+        "--registers", type=int, help="registers to allocate (default: unbounded)"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        help="threads analysing each file's functions; needs a free-threaded "
+        "Python, elsewhere the single fused walk is used",
+    )
+    args = parser.parse_args()
+
+    sources = find_sources(args.paths)
+    totals = dict.fromkeys(PHASES, 0.0)
+    failed = []
+    cached = 0
+    start = time.perf_counter()
+    results = compile_batch(
+        sources,
+        args.jobs,
+        cache=args.cache,
+        registers=args.registers,
+        threads=args.threads,
+    )
+    for result in results:
+        cached += result.cached
+        for phase, seconds in result.timings.items():
+            totals[phase] += seconds
+        if result.error:
+            failed.append(result)
+            print(f"FAIL {result.path}: {result.error}")
+        elif not args.quiet:
+            ms = result.total * 1e3
+            print(f"ok   {result.path}: {result.count} insns, {ms:.1f} ms")
+    wall = time.perf_counter() - start
+
+    busy = sum(totals.values())
+    print(f"{len(sources)} files, {len(failed)} failed, {args.jobs} workers")
+    if args.cache:
+        print(f"AST cache: {cached} hits, {len(sources) - cached} misses")
+    for phase in PHASES:
+        print(f"  {phase:10} {totals[phase]:8.3f} s")
+    print(f"compile time {busy:.3f} s, wall time {wall:.3f} s ({busy / wall:.2f}x)")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import dataclasses
+import hashlib
+import itertools
+from tau.tokens import Coord, Span, Token
+from tau import asts
+from typing import NamedTuple, Sequence
+
+from vm.vm_insns import Insn
+
+import callgraph
+import codegen
+import parse
+import semantic
+import walker
+from scanner import LineIndex
+
+
+class _Parsed(NamedTuple):
+    decl: asts.FuncDecl
+    # every Coord in decl; they belong to decl alone, so moving the
+    # function to another line moves these in place
+    coords: list[Coord]
+
+
+def _private(tokens: Sequence[Token]) -> tuple[list[Token], list[Coord]]:
+    # copies of tokens with Coords of their own: the parser only ever reuses
+    # token Coords in spans, so these are all the Coords of the tree
+    copies = []
+    coords = []
+    for token in tokens:
+        start = Coord(token.span.start.line, token.span.start.column)
+        end = Coord(token.span.end.line, token.span.end.column)
+        copies.append(Token(token.kind, token.value, Span(start, end)))
+        coords += start, end
+    return copies, coords
+
+
+class IncrementalParser:
+    # parses a program one top-level function at a time and keeps each
+    # FuncDecl for the next parse(). A function is fingerprinted by its
+    # source text from its func token to the next one, plus that token's
+    # column: the same fingerprint lexes to the same tokens at the same
+    # relative positions, so its FuncDecl can be reused after moving it to
+    # its new line. Reused FuncDecls are moved in place, which means the
+    # spans in a Program returned earlier move along with them
+    def __init__(self, parser: type[parse.Parser] = parse.Parser):
+        self.parser = parser
+        self._cache: dict[tuple[int, str], _Parsed] = {}
+        self.reused = 0
+        self.parsed = 0
+
+    def parse(self, source: str, tokens: Sequence[Token]) -> asts.Program:
+        # tokens must be the tokens of source, e.g. a Scanner's input and
+        # tokens after any number of edit() calls. The Program returned is
+        # only good until the next call: that one hands the same FuncDecls
+        # out again, with their spans moved to the new source's lines, so
+        # every span of an earlier Program, and of any FuncDecl kept from
+        # it (as IncrementalCompiler keeps them), may change under it. Use
+        # serialize or copy.deepcopy to keep a Program across calls
+        ranges = parse.split_functions(tokens)
+        if ranges is None:
+            return self.parser(tokens).parse()
+        lines = LineIndex(source)
+        starts = [tokens[start].span.start for start, _ in ranges]
+        offsets = [lines.offset(coord) for coord in starts] + [len(source)]
+        eof = tokens[-1]
+        cache: dict[tuple[int, str], _Parsed] = {}
+        decls = []
+        self.reused = self.parsed = 0
+        for i, (start, end) in enumerate(ranges):
+            key = (starts[i].column, source[offsets[i] : offsets[i + 1]])
+            # popped, so two copies of one function never share a FuncDecl
+            parsed = self._cache.pop(key, None)
+            if parsed is None:
+                chunk, coords = _private(tokens[start:end])
+                try:
+                    decl = parse.parse_function([*chunk, eof], self.parser)
+                except parse.ParseErrorException:
+                    # reported the way the whole program reports it
+                    return self.parser(tokens).parse()
+                parsed = _Parsed(decl, coords)
+                self.parsed += 1
+            else:
+                moved = starts[i].line - parsed.decl.span.start.line
+                for coord in parsed.coords if moved else ():
+                    coord.line += moved
+                self.reused += 1
+            cache[key] = parsed
+            decls.append(parsed.decl)
+        self._cache = cache
+        return parse.program(decls)
+
+
+# the fields of each node type that hold tokens or plain values
+_LEAVES: dict[type, tuple[str, ...]] = {
+    cls: tuple(
+        field.name
+        for field in dataclasses.fields(cls)
+        if field.name != "span" and field.name not in children
+    )
+    for cls, children in walker.CHILDREN.items()
+}
+
+
+class _Fingerprint(NamedTuple):
+    digest: bytes
+    # the names used as expressions in the function, each once
+    names: tuple[str, ...]
+
+
+def _fingerprint(decl: asts.FuncDecl) -> _Fingerprint:
+    # a digest of decl's node types and token values in preorder, with the
+    # length of each list of children and a mark for each missing child, so
+    # that two functions get the same digest when only their spans differ.
+    # Kept on decl: the passes never reshape a tree, and IncrementalParser
+    # hands the same FuncDecl back for an unedited function
+    fingerprint = getattr(decl, "fingerprint", None)
+    if fingerprint is not None:
+        return fingerprint
+    digest = hashlib.blake2b()
+    names: dict[str, None] = {}
+    stack: list[asts.AST] = [decl]
+    while stack:
+        node = stack.pop()
+        cls = type(node)
+        parts = [cls.__name__]
+        for name in _LEAVES[cls]:
+            value = getattr(node, name)
+            parts.append(value.value if isinstance(value, Token) else repr(value))
+        children: list[asts.AST] = []
+        for name in walker.CHILDREN[cls]:
+            child = getattr(node, name)
+            if child is None:
+                parts.append("-")
+            elif type(child) is list:
+                parts.append(str(len(child)))
+                children.extend(child)
+            else:
+                children.append(child)
+        if cls is asts.IdExpr:
+            names[node.id.token.value] = None
+        digest.update("\0".join(parts).encode())
+        digest.update(b"\1")
+        stack.extend(reversed(children))
+    decl.fingerprint = _Fingerprint(digest.digest(), tuple(names))
+    return decl.fingerprint
+
+
+class _Compiled(NamedTuple):
+    # a function after the semantic passes, the functions it uses and its
+    # code
+    decl: asts.FuncDecl
+    calls: list[str]
+    insns: list[Insn]
+
+
+class IncrementalCompiler:
+    # semantic analysis and code generation a function at a time, keeping
+    # each function's analysed FuncDecl and code for the next compile(). A
+    # function is keyed by its fingerprint and the signatures of the earlier
+    # functions its names may refer to: while those stay the same, so do its
+    # types, frame and code, and it is neither checked nor generated again.
+    # Only the function symbols and signatures are made afresh each time,
+    # from the functions' headers. A reused function's nodes keep what the
+    # passes set on the FuncDecl that was analysed, which is the one in the
+    # program unless the function was parsed anew. Its spans are those of
+    # the latest IncrementalParser.parse() that returned it, see there.
+    # registers is passed to codegen.process, and fixed for the compiler's
+    # life as its code is kept
+    def __init__(self, registers: int | None = None) -> None:
+        self.registers = registers
+        self._cache: dict[tuple, _Compiled] = {}
+        self.reused = 0
+        self.compiled = 0
+
+    def compile(self, ast: asts.Program) -> list[Insn]:
+        # what semantic.process then codegen.process would give
+        self.reused = self.compiled = 0
+        try:
+            return self._compile(ast)
+        except Exception:
+            # reported the way the whole program reports it
+            self._cache = {}
+            semantic.process(ast)
+            return codegen.process(ast, self.registers)
+
+    def _compile(self, ast: asts.Program) -> list[Insn]:
+        functions = semantic.declare_functions(ast)
+        if "main" not in (function.name for function in functions):
+            raise NameError("main not found", ast.span)
+        signatures = {}
+        keys = []
+        for decl, function in zip(ast.decls, functions):
+            signatures[function.name] = function.get_type()
+            fingerprint = _fingerprint(decl)
+            # a name may be a local hiding the function, so these are only
+            # the functions the body may use
+            used = tuple(
+                (name, id(signatures[name]))
+                for name in fingerprint.names
+                if name in signatures
+            )
+            keys.append((fingerprint.digest, used))
+        # the functions to analyse, a run of consecutive ones at a time
+        misses = [i for i, key in enumerate(keys) if key not in self._cache]
+        for _, run in itertools.groupby(enumerate(misses), lambda p: p[1] - p[0]):
+            indices = [i for _, i in run]
+            semantic.analyse(ast, indices[0], indices[-1] + 1, functions)
+        cache = {}
+        for decl, key in zip(ast.decls, keys):
+            compiled = self._cache.get(key)
+            if compiled is None:
+                calls = list(callgraph.calls(decl))
+                insns = codegen.function(decl, self.registers)
+                compiled = _Compiled(decl, calls, insns)
+                self.compiled += 1
+            else:
+                self.reused += 1
+            cache[key] = compiled
+        self._cache = cache
+        program = [cache[key] for key in keys]
+        live = callgraph.reachable(
+            {c.decl.id.token.value: c.calls for c in program}
+        )
+        return codegen.link(
+            c.insns for c in program if c.decl.id.token.value in live
+        )
@@ -0,0 +1,26 @@
+class NameTable:
+    # per-compilation intern table: every distinct identifier or literal text
+    # maps to one shared string object and a small integer id. Passes that key
+    # dicts by name then hash each name once and compare by identity.
+    def __init__(self) -> None:
+        self.ids: dict[str, int] = {}
+        self.names: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def id(self, name: str) -> int:
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def intern(self, name: str) -> str:
+        return self.names[self.id(name)]
+
+    def name(self, i: int) -> str:
+        return self.names[i]
@@ -3,6 +3,9 @@
 
 from tau import asts
 
+import dispatch
+import walker
+
 
 def process(ast: asts.Program) -> None:
     _Program(ast)
@@ -17,17 +20,7 @@ def _Program(ast: asts.Program) -> int:
 
 
 def _Decl(ast: asts.Decl, current: int) -> int:
-    retval: int
-    match ast:
-        case asts.FuncDecl():
-            retval = _FuncDecl(ast, current)
-        case asts.ParamDecl():
-            retval = _ParamDecl(ast, current)
-        case asts.VarDecl():
-            retval = _VarDecl(ast, current)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
-    return retval
+    return _DECL[type(ast)](ast, current)
 
 
 def _FuncDecl(ast: asts.FuncDecl, current: int) -> int:
@@ -56,30 +49,19 @@ def _VarDecl(ast: asts.VarDecl, current: int) -> int:
     # ast.type_ast : TypeAST
     retval: int = current
     ast.id.symbol.offset = current + 3
-    retval = current + 1
+    retval = current + _slots(ast.type_ast)
     return retval
 
 
+def _slots(ast: asts.TypeAST) -> int:
+    # a fixed-size array's elements take a slot each, from its offset up
+    if type(ast) is asts.ArrayType and ast.size is not None:
+        return int(ast.size.value)
+    return 1
+
+
 def _Stmt(ast: asts.Stmt, current: int) -> int:
-    retval: int = 0
-    match ast:
-        case asts.AssignStmt():
-            retval = _AssignStmt(ast, current)
-        case asts.CallStmt():
-            retval = _CallStmt(ast, current)
-        case asts.CompoundStmt():
-            retval = _CompoundStmt(ast, current)
-        case asts.IfStmt():
-            retval = _IfStmt(ast, current)
-        case asts.PrintStmt():
-            retval = _PrintStmt(ast, current)
-        case asts.ReturnStmt():
-            retval = _ReturnStmt(ast, current)
-        case asts.WhileStmt():
-            retval = _WhileStmt(ast, current)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
-    return retval
+    return _STMT[type(ast)](ast, current)
 
 
 def _AssignStmt(ast: asts.AssignStmt, current: int) -> int:
@@ -105,10 +87,11 @@ def _CompoundStmt(ast: asts.CompoundStmt, current: int) -> int:
 
 
 def _IfStmt(ast: asts.IfStmt, current: int) -> int:
-    retval: int = 0
-    _CompoundStmt(ast.thenStmt, current)
+    # both branches start at current, as never both run: the frame needs
+    # room for the larger one only
+    retval: int = _CompoundStmt(ast.thenStmt, current)
     if ast.elseStmt:
-        _CompoundStmt(ast.elseStmt, current)
+        retval = max(retval, _CompoundStmt(ast.elseStmt, current))
     return retval
 
 
@@ -123,6 +106,46 @@ def _ReturnStmt(ast: asts.ReturnStmt, current: int) -> int:
 
 
 def _WhileStmt(ast: asts.WhileStmt, current: int) -> int:
-    retval: int = 0
-    _CompoundStmt(ast.stmt, current)
+    retval: int = _CompoundStmt(ast.stmt, current)
     return retval
+
+
+_DECL = dispatch.Dispatch(asts.Decl, globals())
+_STMT = dispatch.Dispatch(asts.Stmt, globals())
+
+
+class Visitor(walker.Visitor):
+    # the same pass as hooks for a walker.Walker; bindings must run first.
+    # blocks holds [current, retval] of each open CompoundStmt, as the
+    # recursive _CompoundStmt keeps them
+    param: int
+    blocks: list[list[int]]
+
+    def __init__(self) -> None:
+        self.param = -2
+        self.blocks = []
+
+    def enter_FuncDecl(self, ast: asts.FuncDecl, parent: asts.AST) -> None:
+        self.param = -2
+
+    def enter_ParamDecl(self, ast: asts.ParamDecl, parent: asts.AST) -> None:
+        self.param = _ParamDecl(ast, self.param)
+
+    def enter_VarDecl(self, ast: asts.VarDecl, parent: asts.AST) -> None:
+        block = self.blocks[-1]
+        block[0] = block[1] = _VarDecl(ast, block[0])
+
+    def enter_CompoundStmt(self, ast: asts.CompoundStmt, parent: asts.AST) -> None:
+        current = 0 if type(parent) is asts.FuncDecl else self.blocks[-1][0]
+        self.blocks.append([current, current])
+
+    def exit_CompoundStmt(self, ast: asts.CompoundStmt, parent: asts.AST) -> None:
+        retval = self.blocks.pop()[1]
+        if type(parent) is asts.FuncDecl:
+            parent.size = retval + 3
+        else:
+            # the enclosing block, whether this one is nested in it directly
+            # or is a branch or loop body of one of its statements
+            block = self.blocks[-1]
+            if retval > block[1]:
+                block[1] = retval
@@ -0,0 +1,66 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from tau import asts
+
+import parse
+import serialize
+from names import NameTable
+from scanner import Scanner, _lex
+
+
+_FUNC = re.compile(r"func(?![A-Za-z0-9])")
+_LETTERS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz")
+
+
+def function_offsets(source: str) -> list[int]:
+    # offsets of the func keywords in source, found without lexing it: a
+    # "func" is the keyword unless it ends an identifier (a letter before
+    # it, maybe followed by digits) or sits in a comment
+    offsets = []
+    for m in _FUNC.finditer(source):
+        pos = before = m.start()
+        while before > 0 and source[before - 1].isdigit():
+            before -= 1
+        if before > 0 and source[before - 1] in _LETTERS:
+            continue
+        if "//" in source[source.rfind("\n", 0, pos) + 1 : pos]:
+            continue
+        offsets.append(pos)
+    return offsets
+
+
+def _parse_text(text: str, line: int, column: int) -> bytes:
+    # a run of whole functions that starts at line:column of the program
+    tokens = _lex(text, NameTable(), 0, line, 1 - column)
+    return serialize.dumps(parse.Parser(tokens).parse().decls)
+
+
+def parse_parallel(source: str, workers: int | None = None) -> asts.Program:
+    # lexes and parses the top-level functions of source in a process pool.
+    # Workers get runs of whole functions as text, a few runs per worker to
+    # even out the load, and send the FuncDecls back serialized; spans are
+    # absolute, since each run is lexed from its own line and column
+    offsets = function_offsets(source)
+    if not offsets:
+        return parse.Parser(Scanner(source)).parse()
+    workers = workers or os.cpu_count() or 1
+    size = -(-len(offsets) // (workers * 4))
+    cuts = [0, *offsets[size::size], len(source)]
+    texts, lines, columns = [], [], []
+    line = 1
+    for start, end in zip(cuts, cuts[1:]):
+        texts.append(source[start:end])
+        lines.append(line)
+        columns.append(start - source.rfind("\n", 0, start))
+        line += texts[-1].count("\n")
+    decls: list[asts.FuncDecl] = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for data in pool.map(_parse_text, texts, lines, columns):
+                decls.extend(serialize.loads(data))
+    except parse.ParseErrorException:
+        # reported the way the whole program reports it
+        return parse.Parser(Scanner(source)).parse()
+    return parse.program(decls)
@@ -1,7 +1,59 @@
 from tau.tokens import Span, Token
 from tau import asts
-
-from typing import NoReturn, Iterable, Iterator
+from scanner import KINDS, KIND_ID, TokenBuffer, TokenList
+
+from typing import NoReturn, Iterable, Iterator, NamedTuple, Sequence
+
+
+def _kinds(*kinds: str) -> int:
+    # a set of token kinds as a bitmask over their KIND_ID numbers
+    mask = 0
+    for kind in kinds:
+        mask |= 1 << KIND_ID[kind]
+    return mask
+
+
+_BIT = {kind: 1 << i for kind, i in KIND_ID.items()}
+
+# precomputed FIRST sets and single-kind masks the productions test against
+_FIRST_EXPRESSION = _kinds("(", "-", "false", "not", "true", "ID", "INT")
+_FIRST_STATEMENT = _kinds("call", "if", "print", "while", "{", "ID")
+_FIRST_BLOCK_ITEM = _kinds("call", "if", "print", "var", "while", "{", "ID")
+_UNARY_OPS = _kinds("-", "not")
+_CALL_OR_INDEX = _kinds("(", "[")
+_BOOLEAN = _kinds("false", "true")
+
+_BOOL = _kinds("bool")
+_CALL = _kinds("call")
+_COLON = _kinds(":")
+_COMMA = _kinds(",")
+_ELSE = _kinds("else")
+_FALSE = _kinds("false")
+_FUNC = _kinds("func")
+_ID = _kinds("ID")
+_IF = _kinds("if")
+_INT = _kinds("INT")
+_INT_TYPE = _kinds("int")
+_LBRACE = _kinds("{")
+_LBRACKET = _kinds("[")
+_LPAREN = _kinds("(")
+_MINUS = _kinds("-")
+_NOT = _kinds("not")
+_PRINT = _kinds("print")
+_RETURN = _kinds("return")
+_TRUE = _kinds("true")
+_VAR = _kinds("var")
+_VOID = _kinds("void")
+_WHILE = _kinds("while")
+
+# binding power of each binary operator; all of them are left associative
+_BINARY_POWER = {
+    _kinds("or"): 1,
+    _kinds("and"): 2,
+    **dict.fromkeys(map(_kinds, ["!=", "<", "<=", "==", ">", ">="]), 3),
+    **dict.fromkeys(map(_kinds, ["+", "-"]), 4),
+    **dict.fromkeys(map(_kinds, ["*", "/"]), 5),
+}
 
 
 class ParseErrorException(Exception):
@@ -21,6 +73,8 @@ class ParseErrorException(Exception):
 class Parser:
     scanner: Iterator[Token]
     _current: Token
+    # 1 << KIND_ID[self._current.kind]
+    _bit: int
 
     def __init__(
         self,
@@ -28,34 +82,42 @@ class Parser:
     ):
         self.scanner: Iterator[Token] = iter(scanner)
         self._current = next(self.scanner)
+        self._bit = _BIT[self._current.kind]
 
     def error(self, msg: str, expected: set[str]) -> NoReturn:
         raise ParseErrorException(msg, self._current, expected)
 
     def match(self, kind: str) -> Token:
-        if self.current() == kind:
+        # kind strings are shared with the scanner's tables, so this is
+        # mostly an identity check
+        if self._current.kind == kind:
             prev: Token = self._current
             try:
                 self._current = next(self.scanner)
+                self._bit = _BIT[self._current.kind]
             except StopIteration:
                 pass
             return prev
         else:
             self.error("", {kind})
 
+    def skip(self, kind: str) -> None:
+        # match a token that no AST node keeps
+        self.match(kind)
+
     def current(self) -> str:
         return self._current.kind
 
     def parse(self) -> asts.Program:
         v = self._grammar()
-        self.match("EOF")
+        self.skip("EOF")
         return v
 
     def _grammar(self) -> asts.Program:
         # grammar -> function { function }
         func_array = []
         func_array.append(self._function())
-        while self.current() in {"func"}:
+        while self._bit & _FUNC:
             func_array.append(self._function())
         return asts.Program(
             decls=func_array,
@@ -67,15 +129,15 @@ class Parser:
         fun = self.match("func")
         token_ID = self.match("ID")
         node_ID = asts.Id(token=token_ID, span=token_ID.span)
-        self.match("(")
+        self.skip("(")
         param_array = []
-        if self.current() in {"ID"}:
+        if self._bit & _ID:
             param_array.append(self._parameter())
-            while self.current() in {","}:
-                self.match(",")
+            while self._bit & _COMMA:
+                self.skip(",")
                 param_array.append(self._parameter())
-        self.match(")")
-        self.match(":")
+        self.skip(")")
+        self.skip(":")
         token_ret = self._type()
         ret_node = self._compound_statement()
         return asts.FuncDecl(
@@ -91,8 +153,8 @@ class Parser:
         param_id = self.match("ID")
         param_node = asts.Id(token=param_id, span=param_id.span)
         typ_node = None
-        if self.current() in {":"}:
-            self.match(":")
+        if self._bit & _COLON:
+            self.skip(":")
             typ_node = self._type()
         return asts.ParamDecl(
             id=param_node,
@@ -105,16 +167,16 @@ class Parser:
         curly = self.match("{")
         var_dec = []
         stat_array = []
-        while self.current() in {"call", "if", "print", "var", "while", "{", "ID"}:
-            if self.current() in {"var"}:
+        while self._bit & _FIRST_BLOCK_ITEM:
+            if self._bit & _VAR:
                 var_dec.append(self._variable_declaration())
-            elif self.current() in {"call", "if", "print", "while", "{", "ID"}:
+            elif self._bit & _FIRST_STATEMENT:
                 stat_array.append(self._statement())
             else:
                 self.error(
                     "syntax error", {"call", "if", "print", "var", "while", "{", "ID"}
                 )
-        if self.current() in {"return"}:
+        if self._bit & _RETURN:
             stat_array.append(self._return_statement())
         end_curly = self.match("}")
         return asts.CompoundStmt(
@@ -128,7 +190,7 @@ class Parser:
         var_start = self.match("var")
         token_ID = self.match("ID")
         node = asts.Id(token=token_ID, span=token_ID.span)
-        self.match(":")
+        self.skip(":")
         typ_node = self._type()
         return asts.VarDecl(
             id=node,
@@ -138,17 +200,17 @@ class Parser:
 
     def _statement(self) -> asts.Stmt:
         # statement -> if_statement | while_statement | print_statement | call_statement | assignment_statement | compound_statement
-        if self.current() in {"if"}:
+        if self._bit & _IF:
             return self._if_statement()
-        elif self.current() in {"while"}:
+        elif self._bit & _WHILE:
             return self._while_statement()
-        elif self.current() in {"print"}:
+        elif self._bit & _PRINT:
             return self._print_statement()
-        elif self.current() in {"call"}:
+        elif self._bit & _CALL:
             return self._call_statement()
-        elif self.current() in {"ID"}:
+        elif self._bit & _ID:
             return self._assignment_statement()
-        elif self.current() in {"{"}:
+        elif self._bit & _LBRACE:
             return self._compound_statement()
         else:
             self.error("syntax error", {"call", "if", "print", "while", "{", "ID"})
@@ -159,8 +221,8 @@ class Parser:
         exp = self._expression()
         comp = self._compound_statement()
         else_comp = None
-        if self.current() in {"else"}:
-            self.match("else")
+        if self._bit & _ELSE:
+            self.skip("else")
             else_comp = self._compound_statement()
         end_span = else_comp.span.end if else_comp else comp.span.end
         return asts.IfStmt(
@@ -202,9 +264,9 @@ class Parser:
             id=asts.Id(token=id_token, span=id_token.span), span=id_token.span
         )
         temp: asts.Expr = node
-        if self.current() in {"["}:
+        if self._bit & _LBRACKET:
             temp = self._array_index(node)
-        self.match("=")
+        self.skip("=")
         temp2 = self._expression()
         return asts.AssignStmt(
             lhs=temp, rhs=temp2, span=Span(id_token.span.start, temp2.span.end)
@@ -215,92 +277,40 @@ class Parser:
         start_ret = self.match("return")
         end = start_ret.span.end
         node = None
-        if self.current() in {"(", "-", "false", "not", "true", "ID", "INT"}:
+        if self._bit & _FIRST_EXPRESSION:
             node = self._expression()
             end = node.span.end
         return asts.ReturnStmt(expr=node, span=Span(start_ret.span.start, end))
 
-    def _expression(self) -> asts.Expr:
-        # expression -> logical_or_expression
-        return self._logical_or_expression()
-
-    def _logical_or_expression(self) -> asts.Expr:
-        # logical_or_expression -> logical_and_expression { "or" logical_and_expression }
-        l_exp = self._logical_and_expression()
-        while self.current() in {"or"}:
-            or_token = self.match("or")
-            r_exp = self._logical_and_expression()
-            l_exp = asts.BinaryOp(
-                op=or_token,
-                left=l_exp,
-                right=r_exp,
-                span=Span(l_exp.span.start, r_exp.span.end),
-            )
-        return l_exp
-
-    def _logical_and_expression(self) -> asts.Expr:
-        # logical_and_expression -> comparison_expression { "and" comparison_expression }
-        comp = self._comparison_expression()
-        while self.current() in {"and"}:
-            and_token = self.match("and")
-            comp2 = self._comparison_expression()
-            comp = asts.BinaryOp(
-                op=and_token,
-                left=comp,
-                right=comp2,
-                span=Span(comp.span.start, comp2.span.end),
-            )
-        return comp
-
-    def _comparison_expression(self) -> asts.Expr:
-        # comparison_expression -> addition_expression { comparison_operator addition_expression }
-        left_expr = self._addition_expression()
-        while self.current() in {"!=", "<", "<=", "==", ">", ">="}:
+    def _expression(self, min_power: int = 1) -> asts.Expr:
+        # expression -> logical_or_expression, and every level below it down
+        # to not_expression, parsed by precedence climbing over
+        # _BINARY_POWER: an operator is folded in here while it binds at
+        # least min_power, and its right operand takes only tighter ones
+        if self._bit & _UNARY_OPS:
+            left = self._not_expression()
+        else:
+            left = self._primary_expression()
+        power = _BINARY_POWER.get(self._bit, 0)
+        while power >= min_power:
             op_token = self.match(self.current())
-            right_expr = self._addition_expression()
-            left_expr = asts.BinaryOp(
+            right = self._expression(power + 1)
+            left = asts.BinaryOp(
                 op=op_token,
-                left=left_expr,
-                right=right_expr,
-                span=Span(start=left_expr.span.start, end=right_expr.span.end),
+                left=left,
+                right=right,
+                span=Span(left.span.start, right.span.end),
             )
-        return left_expr
-
-    def _addition_expression(self) -> asts.Expr:
-        # addition_expression -> multiplication_expression { plus_min multiplication_expression }
-        mul = self._multiplication_expression()
-        while self.current() in {"+", "-"}:
-            op_token = self._plus_min()
-            mul2 = self._multiplication_expression()
-            mul = asts.BinaryOp(
-                op=op_token,
-                left=mul,
-                right=mul2,
-                span=Span(mul.span.start, mul2.span.end),
-            )
-        return mul
-
-    def _multiplication_expression(self) -> asts.Expr:
-        # multiplication_expression -> not_expression { multi_div not_expression }
-        not_exp = self._not_expression()
-        while self.current() in {"*", "/"}:
-            op_token = self._multi_div()
-            not_exp2 = self._not_expression()
-            not_exp = asts.BinaryOp(
-                op=op_token,
-                left=not_exp,
-                right=not_exp2,
-                span=Span(not_exp.span.start, not_exp2.span.end),
-            )
-        return not_exp
+            power = _BINARY_POWER.get(self._bit, 0)
+        return left
 
     def _not_expression(self) -> asts.Expr:
         # not_expression -> { "not" | "-" } primary_expression
         not_array = []
-        while self.current() in {"-", "not"}:
-            if self.current() in {"not"}:
+        while self._bit & _UNARY_OPS:
+            if self._bit & _NOT:
                 not_array.append(self.match("not"))
-            elif self.current() in {"-"}:
+            elif self._bit & _MINUS:
                 not_array.append(self.match("-"))
             else:
                 self.error("syntax error", {"-", "not"})
@@ -313,41 +323,41 @@ class Parser:
 
     def _primary_expression(self) -> asts.Expr:
         # primary_expression -> INT | boolean | ID [ function_call | array_index ] | "(" expression ")"
-        if self.current() in {"INT"}:
+        if self._bit & _INT:
             int_token = self.match("INT")
             return asts.IntLiteral(token=int_token, span=int_token.span)
-        elif self.current() in {"false", "true"}:
+        elif self._bit & _BOOLEAN:
             return self._boolean()
-        elif self.current() in {"ID"}:
+        elif self._bit & _ID:
             token = self.match("ID")
             base = asts.IdExpr(
                 span=token.span, id=asts.Id(token=token, span=token.span)
             )
-            if self.current() in {"(", "["}:
-                if self.current() == "(":
+            if self._bit & _CALL_OR_INDEX:
+                if self._bit & _LPAREN:
                     return self._function_call(base)
-                elif self.current() == "[":
+                elif self._bit & _LBRACKET:
                     return self._array_index(base)
                 else:
                     self.error("syntax error", {"(", "["})
             return base
-        elif self.current() in {"("}:
-            self.match("(")
+        elif self._bit & _LPAREN:
+            self.skip("(")
             expr_node = self._expression()
-            self.match(")")
+            self.skip(")")
             return expr_node
         else:
             self.error("syntax error", {"(", "false", "true", "ID", "INT"})
 
     def _function_call(self, name: asts.IdExpr) -> asts.CallExpr:
         # function_call -> "(" [ expression { "," expression } ] ")"
-        self.match("(")
+        self.skip("(")
         func_args = []
-        if self.current() in {"(", "-", "false", "not", "true", "ID", "INT"}:
+        if self._bit & _FIRST_EXPRESSION:
             exp = self._expression()
             func_args.append(asts.Argument(expr=exp, span=exp.span))
-            while self.current() in {","}:
-                self.match(",")
+            while self._bit & _COMMA:
+                self.skip(",")
                 exp = self._expression()
                 func_args.append(asts.Argument(expr=exp, span=exp.span))
         end = self.match(")")
@@ -358,7 +368,7 @@ class Parser:
         )
 
     def _array_index(self, name: asts.IdExpr) -> asts.ArrayCell:
-        if self.current() in {"["}:
+        if self._bit & _LBRACKET:
             start = self.match("[")
             index = self._expression()
             end = self.match("]")
@@ -368,16 +378,16 @@ class Parser:
 
     def _type(self) -> asts.TypeAST:
         # type -> "void" | "int" | "bool" | array_type
-        if self.current() in {"void"}:
+        if self._bit & _VOID:
             void_match = self.match("void")
             return asts.VoidType(void_match.span, void_match)
-        elif self.current() in {"int"}:
+        elif self._bit & _INT_TYPE:
             int_match = self.match("int")
             return asts.IntType(int_match.span, int_match)
-        elif self.current() in {"bool"}:
+        elif self._bit & _BOOL:
             bool_match = self.match("bool")
             return asts.BoolType(bool_match.span, bool_match)
-        elif self.current() in {"["}:
+        elif self._bit & _LBRACKET:
             bracket_match = self._array_type()
             return asts.ArrayType(
                 span=bracket_match.span,
@@ -391,9 +401,9 @@ class Parser:
         # array_type -> "[" [ INT ] "]" "int"
         array_start = self.match("[")
         tkn_size = None
-        if self.current() in {"INT"}:
+        if self._bit & _INT:
             tkn_size = self.match("INT")
-        self.match("]")
+        self.skip("]")
         int_match = self.match("int")
         param = asts.IntType(int_match.span, int_match)
         span = Span(array_start.span.start, param.span.end)
@@ -401,46 +411,285 @@ class Parser:
 
     def _boolean(self) -> asts.BoolLiteral:
         # boolean -> "true" | "false"
-        if self.current() in {"true"}:
+        if self._bit & _TRUE:
             true_start = self.match("true")
             return asts.BoolLiteral(true_start.span, true_start, True)
-        elif self.current() in {"false"}:
+        elif self._bit & _FALSE:
             false_start = self.match("false")
             return asts.BoolLiteral(false_start.span, false_start, False)
         else:
             self.error("syntax error", {"false", "true"})
 
-    def _comparison_operator(self) -> Token:
-        # comparison_operator -> "<" | "<=" | "==" | "!=" | ">" | ">="
-        if self.current() in {"<"}:
-            return self.match("<")
-        elif self.current() in {"<="}:
-            return self.match("<=")
-        elif self.current() in {"=="}:
-            return self.match("==")
-        elif self.current() in {"!="}:
-            return self.match("!=")
-        elif self.current() in {">"}:
-            return self.match(">")
-        elif self.current() in {">="}:
-            return self.match(">=")
-        else:
-            self.error("syntax error", {"!=", "<", "<=", "==", ">", ">="})
-
-    def _plus_min(self) -> Token:
-        # plus_min -> "+" | "-"
-        if self.current() in {"+"}:
-            return self.match("+")
-        elif self.current() in {"-"}:
-            return self.match("-")
+
+class BufferParser(Parser):
+    # parses straight out of a TokenBuffer; a Token object is only built when
+    # match() returns one for an AST node, skipped tokens are never built
+    def __init__(self, buffer: TokenBuffer):
+        self.buffer = buffer
+        self._kinds = buffer.kinds
+        self._last = len(buffer) - 1
+        self._pos = 0
+        self._bit = 1 << self._kinds[0]
+
+    def error(self, msg: str, expected: set[str]) -> NoReturn:
+        raise ParseErrorException(msg, self.buffer.token(self._pos), expected)
+
+    def match(self, kind: str) -> Token:
+        if self._bit == _BIT[kind]:
+            prev = self.buffer.token(self._pos)
+            if self._pos < self._last:
+                self._pos += 1
+                self._bit = 1 << self._kinds[self._pos]
+            return prev
         else:
-            self.error("syntax error", {"+", "-"})
-
-    def _multi_div(self) -> Token:
-        # multi_div -> "*" | "/"
-        if self.current() in {"*"}:
-            return self.match("*")
-        elif self.current() in {"/"}:
-            return self.match("/")
+            self.error("", {kind})
+
+    def skip(self, kind: str) -> None:
+        if self._bit == _BIT[kind]:
+            if self._pos < self._last:
+                self._pos += 1
+                self._bit = 1 << self._kinds[self._pos]
         else:
-            self.error("syntax error", {"*", "/"})
+            self.error("", {kind})
+
+    def current(self) -> str:
+        return KINDS[self._kinds[self._pos]]
+
+
+class _Opened(NamedTuple):
+    # the statement a nested block belongs to: "block", "while", "if", or
+    # "else" once the then-block of an if has been closed
+    kind: str
+    start: Token | None = None
+    expr: asts.Expr | None = None
+    then: asts.CompoundStmt | None = None
+
+
+class _Block(NamedTuple):
+    # a compound statement that is still open
+    curly: Token
+    decls: list[asts.VarDecl]
+    stmts: list[asts.Stmt]
+    opened: _Opened
+
+
+class _Context(NamedTuple):
+    # an expression that is still open: the whole expression (closer ""),
+    # or the inside of a "paren", a "call" argument or an "index"
+    closer: str
+    owner: asts.IdExpr | None
+    args: list[asts.Argument]
+    operands: list[asts.Expr]
+    operators: list[tuple[Token, int]]
+    prefixes: list[Token]
+
+
+class ExplicitStack:
+    # mixin for Parser and BufferParser that parses nested blocks and
+    # expressions on explicit stacks instead of by recursion, so nesting
+    # depth is bounded by memory rather than by the recursion limit. Trees,
+    # spans and errors are the same as from the recursive productions
+
+    def _compound_statement(self) -> asts.CompoundStmt:
+        # if/while/block statements push the enclosing block and continue
+        # with the inner one; closing a block builds its statement
+        stack: list[_Block] = []
+        block = _Block(self.match("{"), [], [], _Opened("block"))
+        while True:
+            if self._bit & _FIRST_BLOCK_ITEM:
+                if self._bit & _VAR:
+                    block.decls.append(self._variable_declaration())
+                    continue
+                if self._bit & _IF:
+                    start = self.match("if")
+                    opened = _Opened("if", start, self._expression())
+                elif self._bit & _WHILE:
+                    start = self.match("while")
+                    opened = _Opened("while", start, self._expression())
+                elif self._bit & _LBRACE:
+                    opened = _Opened("block")
+                else:
+                    block.stmts.append(self._statement())
+                    continue
+                stack.append(block)
+                block = _Block(self.match("{"), [], [], opened)
+                continue
+            if self._bit & _RETURN:
+                block.stmts.append(self._return_statement())
+            end_curly = self.match("}")
+            closed = asts.CompoundStmt(
+                decls=block.decls,
+                stmts=block.stmts,
+                span=Span(block.curly.span.start, end_curly.span.end),
+            )
+            if not stack:
+                return closed
+            opened = block.opened
+            block = stack.pop()
+            if opened.kind == "block":
+                block.stmts.append(closed)
+            elif opened.kind == "while":
+                block.stmts.append(
+                    asts.WhileStmt(
+                        expr=opened.expr,
+                        stmt=closed,
+                        span=Span(opened.start.span.start, closed.span.end),
+                    )
+                )
+            elif opened.kind == "if" and self._bit & _ELSE:
+                self.skip("else")
+                stack.append(block)
+                opened = opened._replace(kind="else", then=closed)
+                block = _Block(self.match("{"), [], [], opened)
+            else:
+                else_stmt = None
+                if opened.kind == "else":
+                    closed, else_stmt = opened.then, closed
+                block.stmts.append(
+                    asts.IfStmt(
+                        expr=opened.expr,
+                        thenStmt=closed,
+                        elseStmt=else_stmt,
+                        span=Span(
+                            opened.start.span.start,
+                            (else_stmt or closed).span.end,
+                        ),
+                    )
+                )
+
+    def _expression(self) -> asts.Expr:
+        # shunting-yard: within a context, operands and operators wait on
+        # their own stacks until an operator of lower binding power (or the
+        # end of the context) folds them; parentheses, call arguments and
+        # array indexes open a new context on the stack
+        stack: list[_Context] = []
+        ctx = _Context("", None, [], [], [], [])
+        while True:
+            # operand position
+            while self._bit & _UNARY_OPS:
+                ctx.prefixes.append(self.match(self.current()))
+            if self._bit & _INT:
+                int_token = self.match("INT")
+                operand: asts.Expr = asts.IntLiteral(
+                    token=int_token, span=int_token.span
+                )
+            elif self._bit & _BOOLEAN:
+                operand = self._boolean()
+            elif self._bit & _ID:
+                token = self.match("ID")
+                operand = asts.IdExpr(
+                    span=token.span, id=asts.Id(token=token, span=token.span)
+                )
+                if self._bit & _LPAREN:
+                    self.skip("(")
+                    if self._bit & _FIRST_EXPRESSION:
+                        stack.append(ctx)
+                        ctx = _Context("call", operand, [], [], [], [])
+                        continue
+                    end = self.match(")")
+                    operand = asts.CallExpr(
+                        span=Span(start=operand.span.start, end=end.span.end),
+                        fn=operand,
+                        args=[],
+                    )
+                elif self._bit & _LBRACKET:
+                    self.match("[")
+                    stack.append(ctx)
+                    ctx = _Context("index", operand, [], [], [], [])
+                    continue
+            elif self._bit & _LPAREN:
+                self.skip("(")
+                stack.append(ctx)
+                ctx = _Context("paren", None, [], [], [], [])
+                continue
+            else:
+                self.error("syntax error", {"(", "false", "true", "ID", "INT"})
+            # operator position, reached with a complete operand
+            while True:
+                for tok in reversed(ctx.prefixes):
+                    operand = asts.UnaryOp(
+                        op=tok,
+                        expr=operand,
+                        span=Span(tok.span.start, operand.span.end),
+                    )
+                ctx.prefixes.clear()
+                power = _BINARY_POWER.get(self._bit, 0)
+                operators, operands = ctx.operators, ctx.operands
+                while operators and operators[-1][1] >= power:
+                    op_token = operators.pop()[0]
+                    left = operands.pop()
+                    operand = asts.BinaryOp(
+                        op=op_token,
+                        left=left,
+                        right=operand,
+                        span=Span(left.span.start, operand.span.end),
+                    )
+                if power:
+                    operands.append(operand)
+                    operators.append((self.match(self.current()), power))
+                    break
+                # the expression of this context is complete
+                if not ctx.closer:
+                    return operand
+                if ctx.closer == "call":
+                    ctx.args.append(asts.Argument(expr=operand, span=operand.span))
+                    if self._bit & _COMMA:
+                        self.skip(",")
+                        break
+                    end = self.match(")")
+                    operand = asts.CallExpr(
+                        span=Span(start=ctx.owner.span.start, end=end.span.end),
+                        fn=ctx.owner,
+                        args=ctx.args,
+                    )
+                elif ctx.closer == "index":
+                    end = self.match("]")
+                    operand = asts.ArrayCell(
+                        idx=operand,
+                        arr=ctx.owner,
+                        span=Span(ctx.owner.span.start, end.span.end),
+                    )
+                else:
+                    self.skip(")")
+                ctx = stack.pop()
+
+
+class DeepParser(ExplicitStack, Parser):
+    pass
+
+
+class DeepBufferParser(ExplicitStack, BufferParser):
+    pass
+
+
+def split_functions(tokens: Sequence[Token]) -> list[tuple[int, int]] | None:
+    # grammar -> function { function }, and "func" only ever starts a
+    # function, so the tokens before EOF split into one [start, end) range
+    # per top-level function. None when the input does not start with func
+    if isinstance(tokens, TokenList):
+        kinds: Iterable[str] = tokens.kinds()
+    else:
+        kinds = (token.kind for token in tokens)
+    starts = [i for i, kind in enumerate(kinds) if kind == "func"]
+    if not starts or starts[0] != 0:
+        return None
+    ends = starts[1:] + [len(tokens) - 1]
+    return list(zip(starts, ends))
+
+
+def parse_function(
+    tokens: Sequence[Token], parser: type[Parser] = Parser
+) -> asts.FuncDecl:
+    # one split_functions range, closed by an EOF token. An error at the end
+    # of the range reports that EOF where the whole program would report the
+    # next func, so callers reparse the program to get the exact error
+    p = parser(tokens)
+    decl = p._function()
+    p.skip("EOF")
+    return decl
+
+
+def program(decls: list[asts.FuncDecl]) -> asts.Program:
+    return asts.Program(
+        decls=decls, span=Span(decls[0].span.start, decls[-1].span.end)
+    )
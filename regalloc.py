@@ -0,0 +1,235 @@
+import bisect
+import dataclasses
+import heapq
+
+from vm.vm_insns import *
+
+
+# Linear-scan register allocation (Poletto and Sarkar) for one function's
+# code. codegen names registers "r<n>", as many as assign numbered; here
+# they are virtual and get mapped onto the physical registers "r1" to
+# "r<k>". A value that finds no free register lives in a frame slot
+# instead. It is loaded into "spill1" or "spill2" by an instruction that
+# reads it, and stored from "spill1" by one that writes it. The other
+# registers codegen uses (FP, SP, temp, ...) are left as they are.
+#
+# A virtual register is reused by many statements, so what gets a location
+# is a web: the places a register is live, joined along control flow so
+# that every definition reaching a use shares the use's location. A web's
+# interval runs from its first instruction to its last.
+#
+# No register is live across a Call: codegen saves the live ones around
+# it, see codegen._rval_CallExpr.
+
+_ARITHMETIC = (
+    Add,
+    Sub,
+    Mul,
+    Div,
+    Equal,
+    NotEqual,
+    LessThan,
+    LessThanEqual,
+    GreaterThan,
+    GreaterThanEqual,
+)
+
+# the fields of each instruction that it reads and writes registers in
+_READS: dict[type, tuple[str, ...]] = {
+    **{cls: ("x", "y") for cls in _ARITHMETIC},
+    AddImmediate: ("x",),
+    Move: ("x",),
+    Not: ("x",),
+    Load: ("address",),
+    Store: ("address", "v"),
+    Print: ("v",),
+    JumpIfZero: ("v",),
+    JumpIfNotZero: ("v",),
+    JumpIndirect: ("v",),
+}
+_WRITES: dict[type, tuple[str, ...]] = {
+    **{cls: ("dst",) for cls in _ARITHMETIC},
+    AddImmediate: ("dst",),
+    Immediate: ("dst",),
+    Move: ("dst",),
+    Not: ("dst",),
+    Load: ("dst",),
+}
+
+_FIELDS = {
+    cls: tuple(field.name for field in dataclasses.fields(cls) if field.init)
+    for cls in {*_READS, *_WRITES}
+}
+
+
+def allocate(
+    insns: list[Insn], registers: int, slot: int
+) -> tuple[list[Insn], int]:
+    # insns with each virtual register replaced by a physical one or by a
+    # frame slot, and how many slots the spilled values take. Slots are at
+    # offsets slot, slot + 1, ... from FP
+    if registers < 0:
+        raise ValueError(f"cannot allocate {registers} registers")
+    successors = _successors(insns)
+    reads = [_virtual(insn, _READS) for insn in insns]
+    writes = [_virtual(insn, _WRITES) for insn in insns]
+    live_in = _liveness(successors, reads, writes)
+    web, intervals = _webs(successors, writes, live_in)
+    locations, slots = _scan(intervals, registers, slot)
+    retval: list[Insn] = []
+    for i, insn in enumerate(insns):
+        if not reads[i] and not writes[i]:
+            retval.append(insn)
+            continue
+        changes: dict[str, str] = {}
+        scratch: dict[str, str] = {}
+        for name in _READS.get(type(insn), ()):
+            v = getattr(insn, name)
+            if v not in reads[i]:
+                continue
+            location = locations[web[v, i]]
+            if type(location) is int:
+                if v not in scratch:
+                    scratch[v] = "spill" + str(len(scratch) + 1)
+                    retval.append(AddImmediate(scratch[v], "FP", location))
+                    retval.append(Load(scratch[v], scratch[v]))
+                location = scratch[v]
+            changes[name] = location
+        store = None
+        for name in _WRITES.get(type(insn), ()):
+            v = getattr(insn, name)
+            if v not in writes[i]:
+                continue
+            location = locations[web[v, i]]
+            if type(location) is int:
+                store = location
+                location = "spill1"
+            changes[name] = location
+        cls = type(insn)
+        retval.append(cls(*[changes.get(f, getattr(insn, f)) for f in _FIELDS[cls]]))
+        if store is not None:
+            retval.append(AddImmediate("spill2", "FP", store))
+            retval.append(Store("spill2", "spill1"))
+    return retval, slots
+
+
+def _virtual(insn: Insn, fields: dict[type, tuple[str, ...]]) -> set[str]:
+    retval = set()
+    for name in fields.get(type(insn), ()):
+        v = getattr(insn, name)
+        if type(v) is str and v[:1] == "r" and v[1:].isdigit():
+            retval.add(v)
+    return retval
+
+
+def _successors(insns: list[Insn]) -> list[list[int]]:
+    # a jump out of insns, to the epilogue, leaves the function's registers
+    # dead
+    labels = {insn.label: i for i, insn in enumerate(insns) if type(insn) is Label}
+    retval: list[list[int]] = []
+    for i, insn in enumerate(insns):
+        cls = type(insn)
+        after = [i + 1] if i + 1 < len(insns) else []
+        if cls is Jump:
+            after = [labels[insn.label]] if insn.label in labels else []
+        elif cls is JumpIfZero or cls is JumpIfNotZero:
+            if insn.label in labels:
+                after.append(labels[insn.label])
+        elif cls is JumpIndirect or cls is Halt:
+            after = []
+        retval.append(after)
+    return retval
+
+
+def _liveness(
+    successors: list[list[int]], reads: list[set[str]], writes: list[set[str]]
+) -> list[set[str]]:
+    # the virtual registers live on entry to each instruction, to a fixed
+    # point, as loops jump back
+    live_in: list[set[str]] = [set() for _ in successors]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(successors) - 1, -1, -1):
+            live = set(reads[i])
+            for j in successors[i]:
+                live |= live_in[j] - writes[i]
+            if live != live_in[i]:
+                live_in[i] = live
+                changed = True
+    return live_in
+
+
+def _webs(
+    successors: list[list[int]], writes: list[set[str]], live_in: list[set[str]]
+) -> tuple[dict[tuple[str, int], int], list[tuple[int, int]]]:
+    # the web of each virtual register at each instruction it is live on
+    # entry to or written by, and the interval of each web by number, in
+    # order of their starts
+    parent: dict[tuple[str, int], tuple[str, int]] = {}
+
+    def find(point: tuple[str, int]) -> tuple[str, int]:
+        while parent[point] != point:
+            parent[point] = parent[parent[point]]
+            point = parent[point]
+        return point
+
+    for i in range(len(successors)):
+        for v in live_in[i] | writes[i]:
+            parent[v, i] = (v, i)
+    for i, after in enumerate(successors):
+        for j in after:
+            for v in live_in[j] & (live_in[i] | writes[i]):
+                parent[find((v, j))] = find((v, i))
+    spans: dict[tuple[str, int], list[int]] = {}
+    for point in parent:
+        root = find(point)
+        span = spans.setdefault(root, [point[1], point[1]])
+        span[0] = min(span[0], point[1])
+        span[1] = max(span[1], point[1])
+    roots = sorted(spans, key=lambda root: (spans[root][0], root[0]))
+    number = {root: n for n, root in enumerate(roots)}
+    web = {point: number[find(point)] for point in parent}
+    return web, [(spans[root][0], spans[root][1]) for root in roots]
+
+
+def _scan(
+    intervals: list[tuple[int, int]], registers: int, slot: int
+) -> tuple[list[str | int], int]:
+    # a physical register or a frame offset for each interval, and the
+    # number of slots used. An interval may take the register of one that
+    # ends where it starts: an instruction reads before it writes
+    locations: list[str | int] = [""] * len(intervals)
+    free = list(range(1, registers + 1))
+    active: list[int] = []  # by end
+    spilled: list[int] = []
+    end_of = lambda n: intervals[n][1]
+    for n, (start, end) in enumerate(intervals):
+        while active and end_of(active[0]) <= start:
+            heapq.heappush(free, int(str(locations[active.pop(0)])[1:]))
+        if free:
+            locations[n] = f"r{heapq.heappop(free)}"
+        elif active and end_of(active[-1]) > end:
+            # the value used furthest away goes to memory, as in the paper
+            victim = active.pop()
+            locations[n] = locations[victim]
+            spilled.append(victim)
+        else:
+            spilled.append(n)
+            continue
+        bisect.insort(active, n, key=end_of)
+    # spilled intervals that never overlap share a slot
+    slots = 0
+    free = []
+    taken: list[tuple[int, int]] = []  # (end, offset)
+    for n in sorted(spilled, key=lambda m: intervals[m]):
+        start, end = intervals[n]
+        while taken and taken[0][0] <= start:
+            heapq.heappush(free, heapq.heappop(taken)[1])
+        if free:
+            locations[n] = heapq.heappop(free)
+        else:
+            locations[n] = slot + slots
+            slots += 1
+        heapq.heappush(taken, (end, locations[n]))
+    return locations, slots
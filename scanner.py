@@ -1,138 +1,492 @@
-# THIS IS A STUB FILE FOR THE SCANNER
-# STUDENTS WILL BE FILLING IN THE DETAILS
+from tau.tokens import Token, Span, Coord, punctuation, keywords
+from typing import Iterator, NamedTuple, Sequence, overload
+from collections import deque
+from bisect import bisect_right
+from itertools import accumulate, islice
+from array import array
+import mmap
+import re
 
+from names import NameTable
+
+
+# One master pattern covers every lexeme together with the blanks in front of
+# it. Alternatives are tried in order, so comments come before punctuation
+# ("//" vs "/") and longer punctuation comes before its prefixes ("<=" vs "<").
+# Any other character is skipped, exactly like the old per-character loop did.
+_lexeme_pattern = (
+    r"[ \t\r\x0b\x0c]*"
+    r"(?:(?P<newline>\n)"
+    r"|(?P<comment>//[^\n]*)"
+    r"|(?P<INT>[0-9]+)"
+    r"|(?P<ID>[A-Za-z][A-Za-z0-9]*)"
+    r"|(?P<punct>"
+    + "|".join(re.escape(p) for p in sorted(punctuation, key=len, reverse=True))
+    + r")"
+    r"|(?P<other>.))"
+)
+_lexeme = re.compile(_lexeme_pattern)
+_lexeme_bytes = re.compile(_lexeme_pattern.encode())
+
+# keyword text -> token kind, so identifiers need a single dict probe
+_keyword_kind = {word: word for word in keywords}
+_keyword_kind_bytes = {word.encode(): word for word in keywords}
+_punct_kind = {p: p for p in punctuation}
+_punct_kind_bytes = {p.encode(): p for p in punctuation}
+
+# every token kind gets a small integer id
+KINDS: list[str] = ["EOF", "ID", "INT", *sorted(keywords), *sorted(punctuation)]
+KIND_ID: dict[str, int] = {kind: i for i, kind in enumerate(KINDS)}
+
+
+def _lex(
+    text: str,
+    names: NameTable,
+    pos: int = 0,
+    line: int = 1,
+    line_start: int = 0,
+) -> Iterator[Token]:
+    # line_start is the offset of the first character of the current line;
+    # keywords and punctuation reuse their kind string as the value, while
+    # identifiers and literals are interned in names
+    intern = names.intern
+    for m in _lexeme.finditer(text, pos):
+        group = m.lastgroup
+        if group == "newline":
+            line += 1
+            line_start = m.end()
+            continue
+        if group == "comment" or group == "other":
+            continue
+        value = m.group(group)
+        if group == "ID":
+            kind = _keyword_kind.get(value)
+            if kind is None:
+                kind = "ID"
+                value = intern(value)
+            else:
+                value = kind
+        elif group == "INT":
+            kind = "INT"
+            value = intern(value)
+        else:
+            kind = value = _punct_kind[value]
+        start = m.start(group) - line_start + 1
+        yield Token(
+            kind,
+            value,
+            Span(Coord(line, start), Coord(line, start + len(value))),
+        )
+    end = Coord(line, len(text) - line_start + 1)
+    yield Token("EOF", "", Span(end, end))
 
-from tau.tokens import Token, Span, Coord, punctuation, keywords
-from typing import Iterator
-import string
+
+class TokenStream:
+    # pulls tokens from the lexer on demand; at most `lookahead` tokens past
+    # the next one are ever buffered, so memory does not grow with the input
+    def __init__(self, tokens: Iterator[Token], lookahead: int = 1):
+        self._tokens = tokens
+        self._buffer: deque[Token] = deque()
+        self.lookahead = lookahead
+
+    def __iter__(self) -> "TokenStream":
+        return self
+
+    def __next__(self) -> Token:
+        if self._buffer:
+            return self._buffer.popleft()
+        return next(self._tokens)
+
+    def peek(self, n: int = 0) -> Token | None:
+        # the token n places after the next one, or None past EOF
+        if n > self.lookahead:
+            raise IndexError(f"lookahead {n} exceeds bound {self.lookahead}")
+        while len(self._buffer) <= n:
+            try:
+                self._buffer.append(next(self._tokens))
+            except StopIteration:
+                return None
+        return self._buffer[n]
 
 
 class Scanner:
-    tokens: list[Token]
+    # only eager scanners have tokens; lazy ones cannot edit() either.
+    # After an edit() they are a TokenList rather than a list
+    tokens: Sequence[Token]
 
-    def __init__(self, input: str):
+    def __init__(
+        self,
+        input: str,
+        lazy: bool = False,
+        lookahead: int = 1,
+        names: NameTable | None = None,
+    ):
+        # lazy scanners never build self.tokens; each iteration lexes the
+        # input again while the consumer (e.g. Parser) pulls tokens
         self.input = input
-        self.tokens = []
-        self.token_line = 1
-        self.token_start = 0
-        self.token_col = 0
-        self.tokens = self.get_token()
+        self.names = names if names is not None else NameTable()
+        self.lazy = lazy
+        self.lookahead = lookahead
+        if not lazy:
+            self.tokens = self.get_token()
 
     def __iter__(self) -> Iterator[Token]:
+        if self.lazy:
+            return TokenStream(_lex(self.input, self.names), self.lookahead)
         return iter(self.tokens)
 
     def get_token(self) -> list[Token]:
-        # counter keeps track of character for new line
-        char_counter = 1
-        # loop through input
-        while self.token_col < len(self.input):
-            self.token_start = self.token_col
-            start_coord = Coord(self.token_line, char_counter)
-            if self.input[self.token_col] == "\n":
-                self.token_line += 1
-                char_counter = 1
-                self.token_col += 1
-            # for : case
-            elif self.input[self.token_col] == ":":
-                end_coord = Coord(self.token_line, char_counter + 1)
-                token = Token(":", ":", Span(start_coord, end_coord))
-                self.tokens.append(token)
-                self.token_col += 1
-                char_counter += 1
-            # check if whitespace
-            elif self.input[self.token_col] in string.whitespace:
-                self.token_col += 1
-                char_counter += 1
-            # check if number
-            elif self.input[self.token_col] in string.digits:
-                # loop until not a digit
-                while (
-                    self.token_col < len(self.input)
-                    and self.input[self.token_col] in string.digits
-                ):
-                    self.token_col += 1
-                    char_counter += 1
-                end_coord = Coord(self.token_line, char_counter)
-                # create token
-                token = Token(
-                    "INT",
-                    self.input[self.token_start : self.token_col],
-                    Span(start_coord, end_coord),
-                )
-                self.tokens.append((token))
-            # check if identifier
-            elif self.input[self.token_col] in string.ascii_letters:
-                # loop until not a letter or digit
-                while (
-                    self.token_col < len(self.input)
-                    and self.input[self.token_col]
-                    in string.ascii_letters + string.digits
-                ):
-                    self.token_col += 1
-                    char_counter += 1
-                end_coord = Coord(self.token_line, char_counter)
-                if self.input[self.token_start : self.token_col] in keywords:
-                    token = Token(
-                        self.input[self.token_start : self.token_col],
-                        self.input[self.token_start : self.token_col],
-                        Span(start_coord, end_coord),
-                    )
-                else:
-                    token = Token(
-                        "ID",
-                        self.input[self.token_start : self.token_col],
-                        Span(start_coord, end_coord),
-                    )
-                self.tokens.append((token))
-            # check if comment
-            elif self.input[self.token_col : self.token_col + 2] == "//":
-                while (
-                    self.token_col < len(self.input)
-                    and self.input[self.token_col] != "\n"
-                ):
-                    self.token_col += 1
-                    char_counter += 1
-            elif (
-                self.input[self.token_col : self.token_col + 2] in punctuation
-                or self.input[self.token_col] in punctuation
-            ):
-                next_two_chars = self.input[self.token_col : self.token_col + 2]
-
-                if next_two_chars in punctuation and self.token_col + 2 < len(
-                    self.input
-                ):  # Two-character punctuation
-                    end = Coord(self.token_line, char_counter + 2)
-                    token = Token(
-                        next_two_chars, next_two_chars, Span(start_coord, end)
-                    )
-
-                    self.tokens.append(token)
-                    self.token_col += 2
-                    char_counter += 2
-                elif (
-                    self.input[self.token_col] in punctuation
-                ):  # Single-character punctuation
-                    end = Coord(self.token_line, char_counter + 1)
-                    token = Token(
-                        self.input[self.token_col],
-                        self.input[self.token_col],
-                        Span(start_coord, end),
-                    )
-                    self.tokens.append(token)
-                    self.token_col += 1
-                    char_counter += 1
+        return list(_lex(self.input, self.names))
+
+    def edit(self, offset: int, deleted: int, inserted: str) -> tuple[int, int]:
+        # apply an edit to self.input and relex only the damaged tokens;
+        # returns the range of self.tokens that changed
+        if self.lazy:
+            raise ValueError("edit() needs the tokens of an eager Scanner")
+        result = relex(
+            self.input, self.tokens, offset, deleted, inserted, self.names
+        )
+        self.input = result.source
+        self.tokens = result.tokens
+        return result.start, result.end
+
+
+class Relexed(NamedTuple):
+    source: str
+    tokens: "TokenList"
+    # tokens[start:end] are new; they replace old_tokens[start:old_end]
+    start: int
+    end: int
+    old_end: int
+
+
+# (tokens, start, stop, lines): tokens[start:stop], each moved down by lines
+_Run = tuple[list[Token], int, int, int]
+
+
+def _move(token: Token, lines: int) -> Token:
+    start, end = token.span.start, token.span.end
+    return Token(
+        token.kind,
+        token.value,
+        Span(
+            Coord(start.line + lines, start.column),
+            Coord(end.line + lines, end.column),
+        ),
+    )
+
+
+class TokenList(Sequence[Token]):
+    # a token list made of runs shared with older lists. Edits that add or
+    # remove lines move every later token down or up; a run records that as
+    # one line delta and only builds the moved Token when it is read, so
+    # relex never touches the undamaged tail
+    MAX_RUNS = 64
+
+    def __init__(self, runs: list[_Run]):
+        runs = [run for run in runs if run[1] < run[2]]
+        if len(runs) > self.MAX_RUNS:
+            # too fragmented to index quickly: move every token once
+            tokens = list(self._read(runs))
+            runs = [(tokens, 0, len(tokens), 0)]
+        self._runs = runs
+        self._ends = list(accumulate(stop - start for _, start, stop, _ in runs))
+
+    @classmethod
+    def of(cls, tokens: "Sequence[Token]") -> "TokenList":
+        if isinstance(tokens, TokenList):
+            return tokens
+        return cls([(list(tokens), 0, len(tokens), 0)])
+
+    @staticmethod
+    def _read(runs: list[_Run]) -> Iterator[Token]:
+        for tokens, start, stop, lines in runs:
+            if lines == 0:
+                yield from islice(tokens, start, stop)
             else:
-                self.token_col += 1
-                char_counter += 1
-        # create EOF token
-        self.tokens.append(
-            Token(
-                "EOF",
-                "",
-                Span(
-                    Coord(self.token_line, char_counter),
-                    Coord(self.token_line, char_counter),
-                ),
+                for token in islice(tokens, start, stop):
+                    yield _move(token, lines)
+
+    def __len__(self) -> int:
+        return self._ends[-1] if self._ends else 0
+
+    def __iter__(self) -> Iterator[Token]:
+        return self._read(self._runs)
+
+    @overload
+    def __getitem__(self, i: int) -> Token: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> "TokenList": ...
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return list(self)[i]
+            return TokenList(self.runs(start, stop))
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("token index out of range")
+        r = bisect_right(self._ends, i)
+        tokens, start, _, lines = self._runs[r]
+        token = tokens[start + i - (self._ends[r - 1] if r else 0)]
+        return _move(token, lines) if lines else token
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, (str, bytes)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def kinds(self) -> Iterator[str]:
+        # moving a token does not change its kind, so nothing is built here
+        for tokens, start, stop, _ in self._runs:
+            for token in islice(tokens, start, stop):
+                yield token.kind
+
+    def runs(self, start: int, stop: int, lines: int = 0) -> list[_Run]:
+        # the runs covering self[start:stop], moved down by another lines
+        out = []
+        first = 0
+        for (tokens, lo, hi, moved), end in zip(self._runs, self._ends):
+            a, b = max(start, first), min(stop, end)
+            if a < b:
+                out.append((tokens, lo + a - first, lo + b - first, moved + lines))
+            first = end
+        return out
+
+
+def relex(
+    source: str,
+    tokens: Sequence[Token],
+    offset: int,
+    deleted: int,
+    inserted: str,
+    names: NameTable | None = None,
+) -> Relexed:
+    # replace source[offset:offset + deleted] by inserted and relex from the
+    # last token that ends before the edit until the new tokens line up with
+    # the old ones again; the lexer carries no state between tokens, so once
+    # a new token starts where a shifted old one did, the rest is identical
+    names = names if names is not None else NameTable()
+    tokens = TokenList.of(tokens)
+    old_lines = LineIndex(source)
+    new_source = source[:offset] + inserted + source[offset + deleted :]
+    new_lines = LineIndex(new_source)
+    delta = len(inserted) - deleted
+
+    def old_start(i: int) -> int:
+        return old_lines.offset(tokens[i].span.start)
+
+    # tokens[:lo] end strictly before the edit and are kept as they are
+    last = len(tokens) - 1
+    lo = bisect_right(
+        range(last), offset - 1, key=lambda i: old_lines.offset(tokens[i].span.end)
+    )
+    if lo > 0:
+        end = tokens[lo - 1].span.end
+        restart = old_lines.offset(end)
+        line, line_start = end.line, restart - end.column + 1
+    else:
+        restart, line, line_start = 0, 1, 0
+
+    fresh: list[Token] = []
+    j = lo
+    edit_end = offset + len(inserted)
+    for token in _lex(new_source, names, restart, line, line_start):
+        start = new_lines.offset(token.span.start)
+        if start >= edit_end:
+            while j < last and old_start(j) < start - delta:
+                j += 1
+            old = tokens[j]
+            if (
+                old_start(j) == start - delta
+                and old.kind == token.kind
+                and old.value == token.value
+            ):
+                break
+        fresh.append(token)
+    else:
+        j = len(tokens)
+
+    # tokens after the edit keep their text and move by the same number of
+    # lines; the ones on the edit's last line also move sideways, so only
+    # those are rebuilt here and the rest share the old runs
+    kept = j
+    lines = 0
+    if j < len(tokens):
+        old_end = old_lines.coord(offset + deleted)
+        new_end = new_lines.coord(edit_end)
+        lines = new_end.line - old_end.line
+        columns = new_end.column - old_end.column
+        while kept < len(tokens) and tokens[kept].span.start.line == old_end.line:
+            token = tokens[kept]
+            start, end = token.span.start, token.span.end
+            fresh.append(
+                Token(
+                    token.kind,
+                    token.value,
+                    Span(
+                        Coord(start.line + lines, start.column + columns),
+                        Coord(end.line + lines, end.column + columns),
+                    ),
+                )
             )
-        )
-        return self.tokens
+            kept += 1
+    new_tokens = TokenList(
+        tokens.runs(0, lo)
+        + [(fresh, 0, len(fresh), 0)]
+        + tokens.runs(kept, len(tokens), lines)
+    )
+    return Relexed(new_source, new_tokens, lo, lo + len(fresh), kept)
+
+
+class LineIndex:
+    # maps offsets to line/column; the table of line starts is only built
+    # the first time a position is actually asked for
+    def __init__(self, text: str | bytes | mmap.mmap):
+        self.text = text
+        self._starts: list[int] | None = None
+
+    def _build(self) -> list[int]:
+        newline = "\n" if isinstance(self.text, str) else b"\n"
+        starts = [0]
+        find = self.text.find
+        pos = find(newline)
+        while pos != -1:
+            starts.append(pos + 1)
+            pos = find(newline, pos + 1)
+        self._starts = starts
+        return starts
+
+    def coord(self, offset: int) -> Coord:
+        starts = self._starts if self._starts is not None else self._build()
+        line = bisect_right(starts, offset)
+        return Coord(line, offset - starts[line - 1] + 1)
+
+    def offset(self, coord: Coord) -> int:
+        starts = self._starts if self._starts is not None else self._build()
+        return starts[coord.line - 1] + coord.column - 1
+
+    def span(self, start: int, end: int) -> Span:
+        return Span(self.coord(start), self.coord(end))
+
+
+def _lex_offsets(buffer: bytes | mmap.mmap) -> Iterator[tuple[str, int, int]]:
+    # same lexemes as _lex, but only (kind, start, end) byte offsets are kept
+    for m in _lexeme_bytes.finditer(buffer):
+        group = m.lastgroup
+        if group == "newline" or group == "comment" or group == "other":
+            continue
+        start, end = m.span(group)
+        if group == "ID":
+            kind = _keyword_kind_bytes.get(m.group(group), "ID")
+        elif group == "INT":
+            kind = "INT"
+        else:
+            kind = _punct_kind_bytes[m.group(group)]
+        yield kind, start, end
+    yield "EOF", len(buffer), len(buffer)
+
+
+class MappedSource:
+    # a source file scanned in place through mmap; columns count bytes, which
+    # only differs from Scanner on lines holding non-ASCII characters
+    def __init__(self, path: str, names: NameTable | None = None):
+        self.names = names if names is not None else NameTable()
+        with open(path, "rb") as f:
+            try:
+                self.buffer: bytes | mmap.mmap = mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            except ValueError:
+                # empty files cannot be mapped
+                self.buffer = b""
+        self.lines = LineIndex(self.buffer)
+
+    def __enter__(self) -> "MappedSource":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def offsets(self) -> Iterator[tuple[str, int, int]]:
+        return _lex_offsets(self.buffer)
+
+    def text(self, start: int, end: int) -> str:
+        return self.buffer[start:end].decode()
+
+    def token(self, kind: str, start: int, end: int) -> Token:
+        if kind == "ID" or kind == "INT":
+            value = self.names.intern(self.text(start, end))
+        elif kind == "EOF":
+            value = ""
+        else:
+            value = kind
+        return Token(kind, value, self.lines.span(start, end))
+
+    def __iter__(self) -> Iterator[Token]:
+        for kind, start, end in self.offsets():
+            yield self.token(kind, start, end)
+
+
+class TokenBuffer:
+    # struct-of-arrays token store: token i is kinds[i] (an index into KINDS),
+    # the name names.name(values[i]) and the offsets starts[i]:ends[i] of
+    # self.input. Token objects are only built by token(i)
+    def __init__(self, input: str, names: NameTable | None = None):
+        self.input = input
+        self.names = names if names is not None else NameTable()
+        self.lines = LineIndex(input)
+        self.kinds = array("B")
+        self.values = array("L")
+        self.starts = array("L")
+        self.ends = array("L")
+        self._scan()
+
+    def _scan(self) -> None:
+        name_id = self.names.id
+        kinds, values = self.kinds, self.values
+        starts, ends = self.starts, self.ends
+        for m in _lexeme.finditer(self.input):
+            group = m.lastgroup
+            if group == "newline" or group == "comment" or group == "other":
+                continue
+            value = m.group(group)
+            if group == "ID":
+                kind = _keyword_kind.get(value, "ID")
+            elif group == "INT":
+                kind = "INT"
+            else:
+                kind = value
+            kinds.append(KIND_ID[kind])
+            values.append(name_id(value))
+            start, end = m.span(group)
+            starts.append(start)
+            ends.append(end)
+        kinds.append(KIND_ID["EOF"])
+        values.append(name_id(""))
+        starts.append(len(self.input))
+        ends.append(len(self.input))
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def kind(self, i: int) -> str:
+        return KINDS[self.kinds[i]]
+
+    def span(self, i: int) -> Span:
+        return self.lines.span(self.starts[i], self.ends[i])
+
+    def token(self, i: int) -> Token:
+        kind = KINDS[self.kinds[i]]
+        return Token(kind, self.names.names[self.values[i]], self.span(i))
+
+    def __iter__(self) -> Iterator[Token]:
+        for i in range(len(self.kinds)):
+            yield self.token(i)
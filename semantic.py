@@ -0,0 +1,119 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from tau import asts, symbols
+
+import assign
+import bindings
+import offsets
+import typecheck
+import walker
+
+
+# in the order they would run one after another
+PASSES = (bindings, typecheck, offsets, assign)
+
+
+def process(ast: asts.Program) -> None:
+    # bindings, typecheck, offsets and assign fused into one walk of the
+    # tree, leaving it as running their process() in turn would. Run in
+    # turn, an error in the first pass over the whole program wins over a
+    # later pass's error earlier in it; the single walk may meet the latter
+    # first, so on an error the passes are rerun in turn to raise the one
+    # they would. Should they all succeed, the error was the fused walk's
+    # own, a bug in a Visitor, and it is raised rather than papered over
+    try:
+        walker.Walker([phase.Visitor() for phase in PASSES]).walk(ast)
+    except Exception as e:
+        fused = e
+    else:
+        return
+    for phase in PASSES:
+        phase.process(ast)
+    raise fused
+
+
+class _Bodies(bindings.Visitor):
+    # bindings for functions whose names were declared up front
+    def __init__(self, ctx: bindings.Context) -> None:
+        super().__init__()
+        self.ctx = ctx
+
+    def enter_FuncDecl(self, ast: asts.FuncDecl, parent: asts.AST) -> None:
+        self.ctx.env.setdefault(ast.id.token.value, []).append(ast.id.symbol)
+        self.outer.append(bindings.open_function(ast, self.ctx))
+
+
+def declare_functions(ast: asts.Program) -> list[symbols.Symbol]:
+    # a symbol per function, typed with its signature, as bindings and
+    # typecheck make them. After this a function's body depends only on
+    # the signatures of the functions before it, and analyse() can take
+    # the functions in any order or apart from one another
+    ctx = bindings.Context(symbols.GlobalScope(ast.span))
+    func_bank: set[str] = set()
+    functions = []
+    for decl in ast.decls:
+        decl.id.symbol = bindings.declare(decl.id.token.value, ctx)
+        decl.id.symbol.set_type(typecheck.signature(decl, func_bank))
+        functions.append(decl.id.symbol)
+    return functions
+
+
+def analyse(
+    ast: asts.Program, start: int, stop: int, functions: list[symbols.Symbol]
+) -> None:
+    # functions start to stop - 1, each seeing only those before it
+    ctx = bindings.Context(functions[0].scope)
+    checker = typecheck.Visitor()
+    for function in functions[:start]:
+        ctx.env.setdefault(function.name, []).append(function)
+        checker.func_bank.add(function.name)
+    walk = walker.Walker(
+        [_Bodies(ctx), checker, offsets.Visitor(), assign.Visitor()]
+    ).walk
+    for decl in ast.decls[start:stop]:
+        walk(decl, ast)
+
+
+def free_threaded() -> bool:
+    # whether threads run Python code at the same time: an interpreter built
+    # without the global lock (3.13t and later) that has not turned it back on
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def process_parallel(ast: asts.Program, workers: int | None = None) -> None:
+    # process(ast), with runs of functions analysed concurrently, each run
+    # with its own Visitors once declare_functions() has run. A thread pool
+    # shares the tree and the symbols with no copying or merging back, so
+    # this is a mode for free-threaded interpreters only: under a global
+    # lock the threads take turns and lose to the fused walk, so there, and
+    # with a single worker, this is process(ast). An error is left to
+    # process() to report the way it would
+    workers = workers or os.cpu_count() or 1
+    if not ast.decls or workers == 1 or not free_threaded():
+        process(ast)
+        return
+    try:
+        _threads(ast, workers)
+    except Exception as e:
+        threaded = e
+    else:
+        return
+    # as in process(): an error the passes do not raise is the threads' own
+    process(ast)
+    raise threaded
+
+
+def _threads(ast: asts.Program, workers: int) -> None:
+    functions = declare_functions(ast)
+    size = -(-len(functions) // (workers * 4))
+    starts = range(0, len(functions), size)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        runs = [
+            pool.submit(analyse, ast, start, start + size, functions)
+            for start in starts
+        ]
+        for run in runs:
+            run.result()
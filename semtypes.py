@@ -0,0 +1,36 @@
+from typing import Sequence
+
+from tau import symbols
+
+
+# One instance per semantic type, so passes compare types with "is" and
+# share them rather than allocating a new one per node. Array and function
+# types are interned by structure, which only holds when their parts are
+# canonical too: build them from these constants and functions alone.
+INT = symbols.IntType()
+BOOL = symbols.BoolType()
+VOID = symbols.VoidType()
+
+_arrays: dict[tuple[int, int | None], symbols.ArrayType] = {}
+_funcs: dict[tuple[tuple[int, ...], int], symbols.FuncType] = {}
+
+
+def array_type(
+    element_type: symbols.SemanticType, size: int | None
+) -> symbols.ArrayType:
+    key = (id(element_type), size)
+    canonical = _arrays.get(key)
+    if canonical is None:
+        # setdefault, so two threads interning the same type agree
+        canonical = _arrays.setdefault(key, symbols.ArrayType(element_type, size))
+    return canonical
+
+
+def func_type(
+    params: Sequence[symbols.SemanticType], ret: symbols.SemanticType
+) -> symbols.FuncType:
+    key = (tuple(map(id, params)), id(ret))
+    canonical = _funcs.get(key)
+    if canonical is None:
+        canonical = _funcs.setdefault(key, symbols.FuncType(list(params), ret))
+    return canonical
@@ -0,0 +1,86 @@
+import gc
+import marshal
+from dataclasses import fields
+from typing import Any, Iterator
+
+from tau import asts
+from tau.tokens import Coord, Span, Token
+
+
+# A tree is written as one flat list in preorder, every value led by a tag:
+#   "N" class name, then the node's fields    "L" length, then the items
+#   "T" kind, value, then the span's 4 ints   "S" the span's 4 ints
+#   "V" a plain value (None, bool, int, str)
+# which marshal turns into bytes far faster than pickle handles the objects.
+# Only the fields the parser fills in are kept, not what passes attach.
+
+_NODES: dict[str, type] = {
+    name: cls
+    for name, cls in vars(asts).items()
+    if isinstance(cls, type) and issubclass(cls, asts.AST)
+}
+_FIELDS: dict[type, tuple[str, ...]] = {
+    cls: tuple(f.name for f in fields(cls) if f.init) for cls in _NODES.values()
+}
+
+
+def _span(span: Span, out: list) -> None:
+    out += span.start.line, span.start.column, span.end.line, span.end.column
+
+
+def encode(value: Any, out: list) -> None:
+    if isinstance(value, asts.AST):
+        cls = type(value)
+        out += "N", cls.__name__
+        for name in _FIELDS[cls]:
+            encode(getattr(value, name), out)
+    elif isinstance(value, list):
+        out += "L", len(value)
+        for item in value:
+            encode(item, out)
+    elif isinstance(value, Token):
+        out += "T", value.kind, value.value
+        _span(value.span, out)
+    elif isinstance(value, Span):
+        out.append("S")
+        _span(value, out)
+    else:
+        out += "V", value
+
+
+def _read_span(items: Iterator) -> Span:
+    return Span(
+        Coord(next(items), next(items)), Coord(next(items), next(items))
+    )
+
+
+def decode(items: Iterator) -> Any:
+    tag = next(items)
+    if tag == "N":
+        cls = _NODES[next(items)]
+        return cls(*[decode(items) for _ in _FIELDS[cls]])
+    if tag == "T":
+        return Token(next(items), next(items), _read_span(items))
+    if tag == "S":
+        return _read_span(items)
+    if tag == "L":
+        return [decode(items) for _ in range(next(items))]
+    return next(items)
+
+
+def dumps(tree: Any) -> bytes:
+    out: list = []
+    encode(tree, out)
+    return marshal.dumps(out)
+
+
+def loads(data: bytes) -> Any:
+    # the tree is acyclic, so collections while building it only walk the
+    # growing heap to no effect, several times over for big trees
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return decode(iter(marshal.loads(data)))
+    finally:
+        if enabled:
+            gc.enable()
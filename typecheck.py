@@ -3,6 +3,10 @@
 
 from tau import asts, symbols
 
+import dispatch
+import semtypes
+import walker
+
 
 # Context is placeholder class for your use.
 # You can add whatever you want to it.
@@ -18,14 +22,33 @@ def _Program(ast: asts.Program) -> None:
     ctx = Context()  # <--- fix this!!!
     func_bank = set()
     for decl in ast.decls:
-        if isinstance(decl, asts.FuncDecl):
-            if decl.id.token.value in func_bank:
-                raise NameError(f"Redefinition of symbol, {decl.span}")
-            func_bank.add(decl.id.token.value)
+        _define(decl, func_bank)
         ctx.return_type = decl
         _FuncDecl(decl, ctx)
 
 
+def _define(decl: asts.Decl, func_bank: set[str]) -> None:
+    if isinstance(decl, asts.FuncDecl):
+        if decl.id.token.value in func_bank:
+            raise NameError(f"Redefinition of symbol, {decl.span}")
+        func_bank.add(decl.id.token.value)
+
+
+def signature(ast: asts.FuncDecl, func_bank: set[str]) -> symbols.FuncType:
+    # the type _FuncDecl gives the function, from its header alone, for
+    # checking function bodies apart from one another; func_bank holds the
+    # names of the functions before it
+    _define(ast, func_bank)
+    ctx = Context()
+    for param in ast.params:
+        _TypeAST(param.type_ast, ctx)
+    _TypeAST(ast.ret_type_ast, ctx)
+    return semtypes.func_type(
+        [param.type_ast.semantic_type for param in ast.params],
+        ast.ret_type_ast.semantic_type,
+    )
+
+
 def _Argument(ast: asts.Argument, ctx: Context) -> None:
     _Expr(ast.expr, ctx)
     ast.semantic_type = ast.expr.semantic_type
@@ -38,100 +61,107 @@ def _Id(ast: asts.Id, ctx: Context) -> None:
 
 
 def _Decl(ast: asts.Decl, ctx: Context) -> None:
-    match ast:
-        case asts.FuncDecl():
-            _FuncDecl(ast, ctx)
-        case asts.ParamDecl():
-            _ParamDecl(ast, ctx)
-        case asts.VarDecl():
-            _VarDecl(ast, ctx)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
+    _DECL[type(ast)](ast, ctx)
 
 
 def _FuncDecl(ast: asts.FuncDecl, ctx: Context) -> None:
     _Id(ast.id, ctx)
-    param_array = []
     for param in ast.params:
         _ParamDecl(param, ctx)
-        param_array.append(param.semantic_type)
     _TypeAST(ast.ret_type_ast, ctx)
-    ast.semantic_type = symbols.FuncType(param_array, ast.ret_type_ast.semantic_type)
+    _signature(ast)
+    _CompoundStmt(ast.body, ctx)
+
+
+def _signature(ast: asts.FuncDecl) -> None:
+    # once the parameters and return type are checked, before the body
+    param_array = [param.semantic_type for param in ast.params]
+    ast.semantic_type = semtypes.func_type(param_array, ast.ret_type_ast.semantic_type)
     ast.id.semantic_type = ast.semantic_type
     ast.id.symbol.set_type(ast.semantic_type)
-    _CompoundStmt(ast.body, ctx)
 
 
 def _ParamDecl(ast: asts.ParamDecl, ctx: Context) -> None:
     _Id(ast.id, ctx)
     _TypeAST(ast.type_ast, ctx)
-    ast.id.semantic_type = ast.type_ast.semantic_type
-    ast.semantic_type = ast.type_ast.semantic_type
-    ast.id.symbol.set_type(ast.semantic_type)
+    _declared(ast)
 
 
 def _VarDecl(ast: asts.VarDecl, ctx: Context) -> None:
     _Id(ast.id, ctx)
     _TypeAST(ast.type_ast, ctx)
+    _declared(ast)
+    _sized(ast)
+
+
+def _declared(ast: asts.ParamDecl | asts.VarDecl) -> None:
     ast.id.semantic_type = ast.type_ast.semantic_type
     ast.semantic_type = ast.type_ast.semantic_type
     ast.id.symbol.set_type(ast.semantic_type)
 
 
+def _sized(ast: asts.VarDecl) -> None:
+    # a variable's array lives in its frame, so needs a size; only a
+    # parameter, which refers to the caller's array, may leave it out
+    semantic_type = ast.semantic_type
+    if type(semantic_type) is symbols.ArrayType and semantic_type.size is None:
+        raise TypeError("array variable without a size", ast.span)
+
+
 def _Expr(ast: asts.Expr, ctx: Context) -> None:
-    match ast:
-        case asts.ArrayCell():
-            _ArrayCell(ast, ctx)
-        case asts.BinaryOp():
-            _BinaryOp(ast, ctx)
-        case asts.BoolLiteral():
-            _BoolLiteral(ast, ctx)
-        case asts.CallExpr():
-            _CallExpr(ast, ctx)
-        case asts.IdExpr():
-            _IdExpr(ast, ctx)
-        case asts.IntLiteral():
-            _IntLiteral(ast, ctx)
-        case asts.UnaryOp():
-            _UnaryOp(ast, ctx)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
+    _EXPR[type(ast)](ast, ctx)
 
 
 def _ArrayCell(ast: asts.ArrayCell, ctx: Context) -> None:
     _Expr(ast.arr, ctx)
     _Expr(ast.idx, ctx)
+    _array_cell(ast)
+
+
+def _array_cell(ast: asts.ArrayCell) -> None:
+    array = ast.arr.semantic_type
+    if type(array) is not symbols.ArrayType:
+        raise TypeError("indexing a non-array", ast.span)
+    if ast.idx.semantic_type is not semtypes.INT:
+        raise TypeError("array index must be int", ast.span)
+    ast.semantic_type = array.element_type
 
 
 def _BinaryOp(ast: asts.BinaryOp, ctx: Context) -> None:
     _Expr(ast.left, ctx)
     _Expr(ast.right, ctx)
+    _binary_op(ast)
+
+
+def _binary_op(ast: asts.BinaryOp) -> None:
     if ast.op.value in {"+", "-", "*", "/"}:
-        if not isinstance(ast.left.semantic_type, symbols.IntType) or not isinstance(
-            ast.right.semantic_type, symbols.IntType
-        ):
+        left, right = ast.left.semantic_type, ast.right.semantic_type
+        if left is not semtypes.INT or right is not semtypes.INT:
             raise TypeError("TypeError")
-        ast.semantic_type = symbols.IntType()
+        ast.semantic_type = semtypes.INT
     elif ast.op.value in {"<", ">", "<=", ">=", "==", "!=", "and", "or"}:
-        if type(ast.left.semantic_type) is not type(ast.right.semantic_type):
+        if ast.left.semantic_type is not ast.right.semantic_type:
             raise TypeError(f"{ast.op.value} needs to be same type", ast.span)
-        if ast.op.value in {"and", "or"} and not isinstance(
-            ast.left.semantic_type, symbols.BoolType
-        ):
+        boolean = ast.left.semantic_type is semtypes.BOOL
+        if ast.op.value in {"and", "or"} and not boolean:
             raise TypeError("TypeError")
-        ast.semantic_type = symbols.BoolType()
+        ast.semantic_type = semtypes.BOOL
 
 
 def _BoolLiteral(ast: asts.BoolLiteral, ctx: Context) -> None:
     # ast.token : Token
     # ast.value : bool
-    ast.semantic_type = symbols.BoolType()
+    ast.semantic_type = semtypes.BOOL
 
 
 def _CallExpr(ast: asts.CallExpr, ctx: Context) -> None:
     _Expr(ast.fn, ctx)
     for arg in ast.args:
         _Argument(arg, ctx)
+    _call(ast)
+
+
+def _call(ast: asts.CallExpr) -> None:
     temp = ast.fn.semantic_type
     assert isinstance(temp, symbols.FuncType)
     ast.semantic_type = temp.ret
@@ -146,49 +176,43 @@ def _IdExpr(ast: asts.IdExpr, ctx: Context) -> None:
 
 def _IntLiteral(ast: asts.IntLiteral, ctx: Context) -> None:
     # ast.token : Token
-    ast.semantic_type = symbols.IntType()
+    ast.semantic_type = semtypes.INT
 
 
 def _UnaryOp(ast: asts.UnaryOp, ctx: Context) -> None:
     # ast.op : Token
     _Expr(ast.expr, ctx)
+    _unary_op(ast)
+
+
+def _unary_op(ast: asts.UnaryOp) -> None:
     if ast.op.value == "-":
-        if not isinstance(ast.expr.semantic_type, symbols.IntType):
+        if ast.expr.semantic_type is not semtypes.INT:
             raise TypeError(f"TypeError", ast.span)
-        ast.semantic_type = symbols.IntType()
+        ast.semantic_type = semtypes.INT
     elif ast.op.value == "not":
-        if not isinstance(ast.expr.semantic_type, symbols.BoolType):
+        if ast.expr.semantic_type is not semtypes.BOOL:
             raise TypeError(f"TypeError", ast.span)
-        ast.semantic_type = symbols.BoolType()
+        ast.semantic_type = semtypes.BOOL
     else:
         raise TypeError(f"Invalid: {ast.op.value}", ast.span)
 
 
 def _Stmt(ast: asts.Stmt, ctx: Context) -> None:
-    match ast:
-        case asts.AssignStmt():
-            _AssignStmt(ast, ctx)
-        case asts.CallStmt():
-            _CallStmt(ast, ctx)
-        case asts.CompoundStmt():
-            _CompoundStmt(ast, ctx)
-        case asts.IfStmt():
-            _IfStmt(ast, ctx)
-        case asts.PrintStmt():
-            _PrintStmt(ast, ctx)
-        case asts.ReturnStmt():
-            _ReturnStmt(ast, ctx)
-        case asts.WhileStmt():
-            _WhileStmt(ast, ctx)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
+    _STMT[type(ast)](ast, ctx)
 
 
 def _AssignStmt(ast: asts.AssignStmt, ctx: Context) -> None:
     _Expr(ast.lhs, ctx)
     _Expr(ast.rhs, ctx)
-    if type(ast.lhs.semantic_type) is not type(ast.rhs.semantic_type):
+    _assign(ast)
+
+
+def _assign(ast: asts.AssignStmt) -> None:
+    if ast.lhs.semantic_type is not ast.rhs.semantic_type:
         raise TypeError(f"Not same type")
+    if type(ast.lhs.semantic_type) is symbols.ArrayType:
+        raise TypeError("arrays cannot be assigned", ast.span)
 
 
 def _CallStmt(ast: asts.CallStmt, ctx: Context) -> None:
@@ -216,10 +240,12 @@ def _PrintStmt(ast: asts.PrintStmt, ctx: Context) -> None:
 def _ReturnStmt(ast: asts.ReturnStmt, ctx: Context) -> None:
     if ast.expr:
         _Expr(ast.expr, ctx)
+    _return(ast, ctx)
+
+
+def _return(ast: asts.ReturnStmt, ctx: Context) -> None:
     ast.enclosing_function = ctx.return_type
-    if not isinstance(
-        ast.expr.semantic_type, type(ctx.return_type.ret_type_ast.semantic_type)
-    ):
+    if ast.expr.semantic_type is not ctx.return_type.ret_type_ast.semantic_type:
         raise TypeError("invalid return type")
 
 
@@ -229,33 +255,101 @@ def _WhileStmt(ast: asts.WhileStmt, ctx: Context) -> None:
 
 
 def _TypeAST(ast: asts.TypeAST, ctx: Context) -> None:
-    match ast:
-        case asts.ArrayType():
-            _ArrayType(ast, ctx)
-        case asts.BoolType():
-            _BoolType(ast, ctx)
-        case asts.IntType():
-            _IntType(ast, ctx)
-        case asts.VoidType():
-            _VoidType(ast, ctx)
-        case _:
-            raise NotImplementedError(f"Unknown type {ast}")
+    _TYPE_AST[type(ast)](ast, ctx)
 
 
 def _ArrayType(ast: asts.ArrayType, ctx: Context) -> None:
+    # ast.size : Optional[Token]
     _TypeAST(ast.element_type_ast, ctx)
+    _array_type(ast)
+
+
+def _array_type(ast: asts.ArrayType) -> None:
+    size = None
+    if ast.size is not None:
+        size = int(ast.size.value)
+        if size < 1:
+            raise TypeError("array size must be positive", ast.span)
+    element_type = ast.element_type_ast.semantic_type
+    ast.semantic_type = semtypes.array_type(element_type, size)
 
 
 def _BoolType(ast: asts.BoolType, ctx: Context) -> None:
     # ast.token : Token
-    ast.semantic_type = symbols.BoolType()
+    ast.semantic_type = semtypes.BOOL
 
 
 def _IntType(ast: asts.IntType, ctx: Context) -> None:
     # ast.token : Token
-    ast.semantic_type = symbols.IntType()
+    ast.semantic_type = semtypes.INT
 
 
 def _VoidType(ast: asts.VoidType, ctx: Context) -> None:
     # ast.token : Token
-    ast.semantic_type = symbols.VoidType()
+    ast.semantic_type = semtypes.VOID
+
+
+_DECL = dispatch.Dispatch(asts.Decl, globals())
+_EXPR = dispatch.Dispatch(asts.Expr, globals())
+_STMT = dispatch.Dispatch(asts.Stmt, globals())
+_TYPE_AST = dispatch.Dispatch(asts.TypeAST, globals())
+
+
+class Visitor(walker.Visitor):
+    # the same pass as hooks for a walker.Walker; bindings must run first
+    ctx: Context
+    func_bank: set[str]
+
+    def __init__(self) -> None:
+        self.ctx = Context()
+        self.func_bank = set()
+
+    def enter_FuncDecl(self, ast: asts.FuncDecl, parent: asts.AST) -> None:
+        _define(ast, self.func_bank)
+        self.ctx.return_type = ast
+
+    def exit_ParamDecl(self, ast: asts.ParamDecl, parent: asts.AST) -> None:
+        _declared(ast)
+
+    def exit_VarDecl(self, ast: asts.VarDecl, parent: asts.AST) -> None:
+        _declared(ast)
+        _sized(ast)
+
+    def exit_TypeAST(self, ast: asts.TypeAST, parent: asts.AST) -> None:
+        # an ArrayType's element type was set when it was exited
+        if type(ast) is asts.ArrayType:
+            _array_type(ast)
+        else:
+            _TypeAST(ast, self.ctx)
+        if type(parent) is asts.FuncDecl:
+            _signature(parent)
+
+    def exit_Argument(self, ast: asts.Argument, parent: asts.AST) -> None:
+        ast.semantic_type = ast.expr.semantic_type
+
+    def exit_ArrayCell(self, ast: asts.ArrayCell, parent: asts.AST) -> None:
+        _array_cell(ast)
+
+    def exit_BinaryOp(self, ast: asts.BinaryOp, parent: asts.AST) -> None:
+        _binary_op(ast)
+
+    def exit_BoolLiteral(self, ast: asts.BoolLiteral, parent: asts.AST) -> None:
+        _BoolLiteral(ast, self.ctx)
+
+    def exit_CallExpr(self, ast: asts.CallExpr, parent: asts.AST) -> None:
+        _call(ast)
+
+    def exit_IdExpr(self, ast: asts.IdExpr, parent: asts.AST) -> None:
+        _IdExpr(ast, self.ctx)
+
+    def exit_IntLiteral(self, ast: asts.IntLiteral, parent: asts.AST) -> None:
+        _IntLiteral(ast, self.ctx)
+
+    def exit_UnaryOp(self, ast: asts.UnaryOp, parent: asts.AST) -> None:
+        _unary_op(ast)
+
+    def exit_AssignStmt(self, ast: asts.AssignStmt, parent: asts.AST) -> None:
+        _assign(ast)
+
+    def exit_ReturnStmt(self, ast: asts.ReturnStmt, parent: asts.AST) -> None:
+        _return(ast, self.ctx)
@@ -0,0 +1,83 @@
+from typing import Callable
+
+from tau import asts
+
+
+# the child fields of each node type, in the order every pass visits them;
+# tokens and plain values are not children. A field holds a node, None or
+# a list of nodes
+CHILDREN: dict[type, tuple[str, ...]] = {
+    asts.Program: ("decls",),
+    asts.FuncDecl: ("id", "params", "ret_type_ast", "body"),
+    asts.ParamDecl: ("id", "type_ast"),
+    asts.VarDecl: ("id", "type_ast"),
+    asts.Id: (),
+    asts.ArrayType: ("element_type_ast",),
+    asts.BoolType: (),
+    asts.IntType: (),
+    asts.VoidType: (),
+    asts.CompoundStmt: ("decls", "stmts"),
+    asts.AssignStmt: ("lhs", "rhs"),
+    asts.CallStmt: ("call",),
+    asts.IfStmt: ("expr", "thenStmt", "elseStmt"),
+    asts.PrintStmt: ("expr",),
+    asts.ReturnStmt: ("expr",),
+    asts.WhileStmt: ("expr", "stmt"),
+    asts.ArrayCell: ("arr", "idx"),
+    asts.BinaryOp: ("left", "right"),
+    asts.BoolLiteral: (),
+    asts.CallExpr: ("fn", "args"),
+    asts.Argument: ("expr",),
+    asts.IdExpr: ("id",),
+    asts.IntLiteral: (),
+    asts.UnaryOp: ("expr",),
+}
+
+Hook = Callable[[asts.AST, asts.AST | None], None]
+
+
+class Visitor:
+    # one pass as hooks on a shared traversal. A method enter_<Type> runs
+    # before a node's children are walked and exit_<Type> after they are,
+    # each called with the node and its parent (None for the root). <Type>
+    # may be a base class such as Stmt; the most specific hook wins
+    pass
+
+
+class Walker:
+    # runs several passes in a single preorder/postorder walk of a tree:
+    # at each node the passes' enter hooks run in the order the passes were
+    # given, then the children are walked, then the exit hooks in that
+    # same order. A pass that reads what an earlier pass sets on a node
+    # must therefore come after it, and may only read it once that node
+    # has been entered (or exited, for exit hooks)
+    def __init__(self, visitors: list[Visitor]) -> None:
+        self._plan: dict[type, tuple[list[Hook], tuple[str, ...], list[Hook]]] = {}
+        for cls, fields in CHILDREN.items():
+            before = [h for v in visitors if (h := _hook(v, "enter_", cls))]
+            after = [h for v in visitors if (h := _hook(v, "exit_", cls))]
+            self._plan[cls] = (before, fields, after)
+
+    def walk(self, ast: asts.AST, parent: asts.AST | None = None) -> None:
+        before, fields, after = self._plan[type(ast)]
+        for hook in before:
+            hook(ast, parent)
+        for name in fields:
+            child = getattr(ast, name)
+            if child is None:
+                continue
+            if type(child) is list:
+                for item in child:
+                    self.walk(item, ast)
+            else:
+                self.walk(child, ast)
+        for hook in after:
+            hook(ast, parent)
+
+
+def _hook(visitor: Visitor, prefix: str, cls: type) -> Hook | None:
+    for base in cls.__mro__:
+        hook = getattr(visitor, prefix + base.__name__, None)
+        if hook is not None:
+            return hook
+    return None